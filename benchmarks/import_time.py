@@ -0,0 +1,73 @@
+"""
+Measure the cold start cost of the pyneato entry points.
+
+Every entry point is imported in a fresh interpreter several times and
+the fastest run is reported, together with the modules it pulled in.
+
+    python benchmarks/import_time.py [--runs N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = [
+    "import pyneato",
+    "from pyneato import Neato",
+    "from pyneato import RobotStateEnum",
+    "from pyneato import OrbitalPasswordSession",
+    "from pyneato import Account",
+    "from pyneato import Robot",
+    "from pyneato import AccountManager",
+]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+exec(%r)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "requests": "requests" in sys.modules,
+    "voluptuous": "voluptuous" in sys.modules,
+}))
+"""
+
+
+def measure(statement: str, runs: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE % statement],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return min(results, key=lambda result: result["seconds"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print("%-45s %10s  %-8s %-10s" % ("entry point", "ms", "requests", "voluptuous"))
+    for statement in ENTRY_POINTS:
+        result = measure(statement, args.runs)
+        print("%-45s %10.1f  %-8s %-10s" % (
+            statement,
+            result["seconds"] * 1000,
+            result["requests"],
+            result["voluptuous"],
+        ))
+
+
+if __name__ == "__main__":
+    main()
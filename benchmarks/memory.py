@@ -0,0 +1,98 @@
+"""
+Measure the memory held by the object model of a large account.
+
+Builds an account of --robots robots with one floorplan each from canned
+API responses, then reports the memory held before and after evicting
+the floorplans.
+
+    python benchmarks/memory.py [--robots N] [--rank-size BYTES]
+"""
+import argparse
+import base64
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyneato import Account, Neato, Session  # noqa: E402
+
+
+class _Response:
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class _CannedSession(Session):
+    def __init__(self, robots: int, rank_size: int):
+        super().__init__(Neato())
+        rank = base64.b64encode(os.urandom(rank_size)).decode()
+        self._robots = [
+            {
+                "id": "robot-%d" % index,
+                "user_id": "user",
+                "serial": "serial-%d" % index,
+                "name": "Robot %d" % index,
+                "model_name": "D8",
+                "firmware": "4.5.3",
+                "timezone": "Europe/Berlin",
+                "mac_address": None,
+                "birth_date": "2021-01-01T00:00:00Z",
+                "vendor": "neato",
+            }
+            for index in range(robots)
+        ]
+        self._rank = rank
+
+    def get(self, path, **kwargs):
+        path = path.strip("/")
+        if path == "users/me/robots":
+            return _Response(self._robots)
+
+        robot_id = path.split("/")[1]
+        return _Response([{
+            "floorplan_uuid": "floorplan-%s" % robot_id,
+            "rank_uuid": "rank-%s" % robot_id,
+            "name": "Floor",
+            # A copy per floorplan, like separately decoded responses
+            "processed_rank_binary": self._rank[:-1] + self._rank[-1],
+            "last_modified_at": "2021-01-01T00:00:00Z",
+        }])
+
+
+def _measure(label, fn):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    print("%-30s %10.1f MiB" % (label, (tracemalloc.get_traced_memory()[0] - before) / 2**20))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--robots", type=int, default=10000)
+    parser.add_argument("--rank-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    session = _CannedSession(args.robots, args.rank_size)
+    account = Account(session)
+
+    tracemalloc.start()
+    _measure("robots", lambda: account.robots)
+    _measure("floorplans", lambda: account.floorplans)
+    _measure("evict floorplans", lambda: account.evict_cold_floorplans(0))
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("%-30s %10.1f MiB" % ("total", total / 2**20))
+    print("%-30s %10.0f B" % ("per robot", total / args.robots))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,74 @@
-from .account import Account
-from .floorplan import Floorplan
-from .neato import Neato
-from .robot import Robot, CleaningModeEnum, NavigationModeEnum
-from .robot_state import RobotState, RobotStateDetail, RobotStateCleaningCenter
-from .session import Session, OrbitalPasswordSession
-from .enum import TrackTypeEnum, CleaningModeEnum, RobotStateEnum, RobotAbilityEnum, RobotActionEnum, RobotBaseTypeEnum, BaseTypeEnum, NavigationModeEnum
-from .version import __version__
-from .exception import MyNeatoLoginException, MyNeatoRobotException, MyNeatoException
+"""
+Python package to control Neato vacuum robots.
+
+Submodules are imported on first access of one of their names, so that
+importing the package itself does not pull in requests and voluptuous.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    "Account": ".account",
+    "Floorplan": ".floorplan",
+    "Neato": ".neato",
+    "Robot": ".robot",
+    "RobotState": ".robot_state",
+    "RobotStateDetail": ".robot_state",
+    "RobotStateCleaningCenter": ".robot_state",
+    "Session": ".session",
+    "OrbitalPasswordSession": ".session",
+    "AccountManager": ".manager",
+    "StateSubscription": ".subscription",
+    "ResponseCache": ".cache",
+    "HedgePolicy": ".hedging",
+    "FleetAggregate": ".fleet",
+    "EndpointRouter": ".routing",
+    "TrackTypeEnum": ".enum",
+    "CleaningModeEnum": ".enum",
+    "RobotStateEnum": ".enum",
+    "RobotAbilityEnum": ".enum",
+    "RobotActionEnum": ".enum",
+    "RobotBaseTypeEnum": ".enum",
+    "BaseTypeEnum": ".enum",
+    "NavigationModeEnum": ".enum",
+    "__version__": ".version",
+    "MyNeatoLoginException": ".exception",
+    "MyNeatoRobotException": ".exception",
+    "MyNeatoException": ".exception",
+    "MyNeatoTimeoutException": ".exception",
+    "MyNeatoRobotTimeoutException": ".exception",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .account import Account
+    from .floorplan import Floorplan
+    from .neato import Neato
+    from .robot import Robot
+    from .robot_state import RobotState, RobotStateDetail, RobotStateCleaningCenter
+    from .session import Session, OrbitalPasswordSession
+    from .manager import AccountManager
+    from .subscription import StateSubscription
+    from .cache import ResponseCache
+    from .hedging import HedgePolicy
+    from .fleet import FleetAggregate
+    from .routing import EndpointRouter
+    from .enum import TrackTypeEnum, CleaningModeEnum, RobotStateEnum, RobotAbilityEnum, RobotActionEnum, RobotBaseTypeEnum, BaseTypeEnum, NavigationModeEnum
+    from .version import __version__
+    from .exception import MyNeatoLoginException, MyNeatoRobotException, MyNeatoException, MyNeatoTimeoutException, MyNeatoRobotTimeoutException
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -1,14 +1,29 @@
+import json
 import logging
 import os
 import shutil
-from typing import List
+import threading
+import time
+import typing
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable, Iterator, List, Tuple
 
 import requests
 
-from .exception import MyNeatoRobotException, MyNeatoUnsupportedDevice
+from .exception import (
+    MyNeatoException,
+    MyNeatoLoginException,
+    MyNeatoRobotException,
+    MyNeatoUnsupportedDevice,
+)
 from .session import Session
 from .robot import Robot
-from .floorplan import Floorplan
+from .enum import CleaningModeEnum
+from .floorplan import Floorplan, Track
+from .subscription import StateSubscription
 
 from voluptuous import (
     ALLOW_EXTRA,
@@ -22,10 +37,14 @@ from voluptuous import (
     Schema,
     Url,
 )
+from .schema import LazySchema
+from .tracing import phase, traced
 
 _LOGGER = logging.getLogger(__name__)
 
-USERDATA_SCHEMA = Schema(
+SNAPSHOT_VERSION = 1
+
+USERDATA_SCHEMA = LazySchema(lambda: Schema(
     {
       Required("country_code"): str,
       Required("email"): str,
@@ -39,9 +58,9 @@ USERDATA_SCHEMA = Schema(
       "verified_at": Any(str, None)
     },
     extra=ALLOW_EXTRA,
-)
+))
 
-ROBOT_SCHEMA = Schema(
+ROBOT_SCHEMA = LazySchema(lambda: Schema(
     {
         Required("id"): str,
         Required("user_id"): str,
@@ -55,9 +74,9 @@ ROBOT_SCHEMA = Schema(
         "vendor": Any(str, None),
     },
     extra=ALLOW_EXTRA,
-)
+))
 
-FLOORPLAN_SCHEMA = Schema(
+FLOORPLAN_SCHEMA = LazySchema(lambda: Schema(
     {
         Required("floorplan_uuid"): str,
         Required("rank_uuid"): str,
@@ -65,7 +84,16 @@ FLOORPLAN_SCHEMA = Schema(
         "map_versions_count": int,
     },
     extra=ALLOW_EXTRA,
-)
+))
+
+def _process_rank_image(fn: Callable[[bytes], typing.Any], name: str, size: int):
+    """Run fn on a rank image placed in shared memory by Account.process_floorplans."""
+    buffer = shared_memory.SharedMemory(name=name)
+    try:
+        return fn(bytes(buffer.buf[:size]))
+    finally:
+        buffer.close()
+
 
 class Account:
     def __init__(self, session: Session):
@@ -75,6 +103,9 @@ class Account:
         self._floorplans = []
         self._floorplans_initialized = False
         self._userdata = set()
+        # Canonical objects by serial and uuid, reused when data is refreshed
+        self._robot_registry = weakref.WeakValueDictionary()
+        self._floorplan_registry = weakref.WeakValueDictionary()
 
     @property
     def robots(self) -> List[Robot]:
@@ -108,6 +139,22 @@ class Account:
 
         return self._userdata
 
+    def subscribe(self, callback=None, **kwargs) -> StateSubscription:
+        """
+        Start delivering state updates of all robots of this account.
+
+        :param callback: called as callback(robot, state) for every changed state
+        :return: the subscription, stop it with subscription.stop(). It is started
+            right away if callback is given, otherwise by ``async for``, so
+            an async consumer does not miss the first updates.
+        """
+        subscription = StateSubscription(self.robots, callback, **kwargs)
+        if callback is not None:
+            subscription.start()
+
+        return subscription
+
+    @traced("Account.refresh_robots")
     def refresh_robots(self):
         """
         Get information about robots connected to account.
@@ -115,29 +162,41 @@ class Account:
         :return:
         """
 
-        resp = self._session.get("users/me/robots")
+        with phase("request"):
+            resp = self._session.get("users/me/robots")
+        with phase("decode"):
+            data = resp.json()
 
-        self._robots = []
-        for robot in resp.json():
+        robots = []
+        for robot in data:
             _LOGGER.debug("Create Robot: %s", robot)
             try:
-                ROBOT_SCHEMA(robot)
-                robot_object = Robot(
-                    session=self._session,
-                    serial=robot["serial"],
-                    id=robot["id"],
-                    user_id=robot["user_id"],
-                    name=robot["name"],
-                    endpoint=self._session.endpoint,
-                    vendor_code=robot["vendor"],
-                    vendor=self._session.vendor,
-                )
-                robot_object.birth_date = robot['birth_date']
-                robot_object.firmware = robot['firmware']
-                robot_object.model_name = robot['model_name']
-                robot_object.timezone = robot['timezone']
+                with phase("validate"):
+                    ROBOT_SCHEMA(robot)
+                with phase("construct"):
+                    robot_object = self._robot_registry.get(robot["serial"])
+                    if robot_object is None:
+                        robot_object = Robot(
+                            session=self._session,
+                            serial=robot["serial"],
+                            id=robot["id"],
+                            user_id=robot["user_id"],
+                            name=robot["name"],
+                            endpoint=self._session.endpoint,
+                            vendor_code=robot["vendor"],
+                            vendor=self._session.vendor,
+                        )
+                        self._robot_registry[robot_object.serial] = robot_object
+                    else:
+                        robot_object.id = robot["id"]
+                        robot_object.user_id = robot["user_id"]
+                        robot_object.name = robot["name"]
+                    robot_object.birth_date = robot['birth_date']
+                    robot_object.firmware = robot['firmware']
+                    robot_object.model_name = robot['model_name']
+                    robot_object.timezone = robot['timezone']
 
-                self._robots.append(robot_object)
+                robots.append(robot_object)
             except MultipleInvalid as ex:
                 # Robot was not described accordingly by neato
                 _LOGGER.warning(
@@ -153,31 +212,261 @@ class Account:
                 _LOGGER.warning("Your robot %s is offline.", robot["name"])
                 continue
 
+        self._robots = robots
+
     def refresh_floorplans(self):
         _LOGGER.debug("Getting floorplans")
 
+        floorplans = []
         for robot in self.robots:
-            self.get_floorplan(robot)
+            floorplans.extend(self.get_floorplan(robot))
 
+        self._floorplans = floorplans
         self._floorplans_initialized = True
 
-    def get_floorplan(self, robot: Robot):
+    @traced("Account.get_floorplan")
+    def get_floorplan(self, robot: Robot) -> List[Floorplan]:
         _LOGGER.debug("Getting floorplan for %s", robot.name)
 
-        resp = self._session.get("/robots/%s/floorplans"%robot.id)
+        with phase("request"):
+            resp = self._session.get("/robots/%s/floorplans"%robot.id)
+        with phase("decode"):
+            data = resp.json()
 
-        self._floorplans = []
-        for floorplan in resp.json():
-            FLOORPLAN_SCHEMA(floorplan)
+        floorplans = []
+        for floorplan in data:
+            with phase("validate"):
+                FLOORPLAN_SCHEMA(floorplan)
+            with phase("construct"):
+                floorplan_object = self._floorplan_registry.get(floorplan["floorplan_uuid"])
+                if floorplan_object is None:
+                    floorplan_object = Floorplan(
+                        session = self._session,
+                        uuid = floorplan["floorplan_uuid"],
+                        name = floorplan["name"],
+                        rank_uuid = floorplan["rank_uuid"],
+                        rank_binary = floorplan["processed_rank_binary"],
+                        last_modified_at = floorplan["last_modified_at"],
+                        robot_id = robot.id,
+                    )
+                    self._floorplan_registry[floorplan_object.uuid] = floorplan_object
+                else:
+                    floorplan_object.update(
+                        floorplan["name"],
+                        floorplan["rank_uuid"],
+                        floorplan["processed_rank_binary"],
+                        floorplan["last_modified_at"],
+                    )
+            floorplans.append(floorplan_object)
+
+        self._floorplans = floorplans
+
+        return floorplans
+
+    def evict_cold_floorplans(self, max_idle: float) -> int:
+        """
+        Drop rank images and tracks of floorplans not accessed for max_idle seconds.
+        They are reloaded when accessed again.
+
+        :return: number of evicted floorplans
+        """
+        threshold = time.monotonic() - max_idle
+        evicted = 0
+        for floorplan in self._floorplans:
+            if floorplan.last_used < threshold and not floorplan.is_evicted:
+                floorplan.evict()
+                evicted += floorplan.is_evicted
+
+        return evicted
+
+    def process_floorplans(
+        self, fn: Callable[[bytes], typing.Any], max_workers: int = None
+    ) -> Iterator[Tuple[str, typing.Any]]:
+        """
+        Run fn on the rank image of every floorplan in a pool of processes.
+
+        The decoded images are handed to the workers through shared memory
+        instead of being pickled. fn must be picklable, e.g. a module level
+        function, and receives the PNG data as bytes.
+
+        :return: iterator of (floorplan uuid, result) in order of completion
+        """
+        buffers = {}
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for floorplan in self.floorplans:
+                    image = floorplan.rank_image
+                    buffer = shared_memory.SharedMemory(create=True, size=max(len(image), 1))
+                    buffer.buf[:len(image)] = image
+                    buffers[floorplan.uuid] = buffer
+
+                    future = executor.submit(_process_rank_image, fn, buffer.name, len(image))
+                    futures[future] = floorplan.uuid
+
+                for future in as_completed(futures):
+                    uuid = futures[future]
+                    result = future.result()
+
+                    buffer = buffers.pop(uuid)
+                    buffer.close()
+                    buffer.unlink()
+
+                    yield uuid, result
+        finally:
+            for buffer in buffers.values():
+                buffer.close()
+                buffer.unlink()
+
+    def snapshot(self) -> bytes:
+        """
+        Serialize the robots, floorplans, tracks, userdata and access token
+        loaded so far into a compact binary snapshot.
+
+        :return: the snapshot, restore it with Account.restore
+        """
+        data = {
+            "token": self._session.access_token,
+            "userdata": self._userdata or None,
+            "robots": [
+                {
+                    "serial": robot.serial,
+                    "id": robot.id,
+                    "user_id": robot.user_id,
+                    "name": robot.name,
+                    "vendor_code": robot._vendor_code,
+                    "model_name": robot.model_name,
+                    "firmware": robot.firmware,
+                    "timezone": robot.timezone,
+                    "birth_date": robot.birth_date,
+                }
+                for robot in self._robots
+            ],
+            "floorplans_initialized": self._floorplans_initialized,
+            "floorplans": [
+                {
+                    "uuid": floorplan.uuid,
+                    "robot_id": floorplan.robot_id,
+                    "name": floorplan.name,
+                    "rank_uuid": floorplan.rank_uuid,
+                    "rank_binary": floorplan._rank_binary,
+                    "last_modified_at": floorplan.last_modified_at,
+                    "tracks": [
+                        {
+                            "uuid": track.uuid,
+                            "name": track.name,
+                            "type": track.type,
+                            "cleaning_mode": track.cleaning_mode,
+                        }
+                        for track in floorplan._tracks
+                    ],
+                }
+                for floorplan in self._floorplans
+            ],
+        }
+
+        payload = json.dumps(data, separators=(",", ":")).encode()
+
+        return bytes([SNAPSHOT_VERSION]) + zlib.compress(payload)
+
+    @classmethod
+    def restore(cls, session: Session, snapshot: bytes, revalidate: bool = True) -> "Account":
+        """
+        Create an account from a snapshot created with Account.snapshot.
+
+        The restored objects are bound to the given session, which takes over
+        the stored access token if it has none. With revalidate the data is
+        refreshed from the API in a background thread while the restored
+        objects are already served.
+
+        :return: the restored account
+        """
+        if not snapshot or snapshot[0] != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported account snapshot")
+
+        data = json.loads(zlib.decompress(snapshot[1:]))
+
+        if session.access_token == None and data["token"] != None:
+            session.access_token = data["token"]
+            session.is_active = True
+
+        account = cls(session)
+        if data["userdata"]:
+            account._userdata = data["userdata"]
+
+        for robot in data["robots"]:
+            robot_object = Robot(
+                session=session,
+                serial=robot["serial"],
+                id=robot["id"],
+                user_id=robot["user_id"],
+                name=robot["name"],
+                endpoint=session.endpoint,
+                vendor_code=robot["vendor_code"],
+                vendor=session.vendor,
+            )
+            robot_object.birth_date = robot["birth_date"]
+            robot_object.firmware = robot["firmware"]
+            robot_object.model_name = robot["model_name"]
+            robot_object.timezone = robot["timezone"]
+            account._robot_registry[robot_object.serial] = robot_object
+            account._robots.append(robot_object)
+
+        for floorplan in data["floorplans"]:
             floorplan_object = Floorplan(
-                session = self._session,
-                uuid = floorplan["floorplan_uuid"],
-                name = floorplan["name"],
-                rank_uuid = floorplan["rank_uuid"],
-                rank_binary = floorplan["processed_rank_binary"],
-                last_modified_at = floorplan["last_modified_at"],
+                session=session,
+                uuid=floorplan["uuid"],
+                name=floorplan["name"],
+                rank_uuid=floorplan["rank_uuid"],
+                rank_binary=floorplan["rank_binary"],
+                last_modified_at=floorplan["last_modified_at"],
+                robot_id=floorplan.get("robot_id"),
             )
-            self._floorplans.append(floorplan_object)
+            account._floorplan_registry[floorplan_object.uuid] = floorplan_object
+            for track in floorplan["tracks"]:
+                floorplan_object._tracks.add(Track(
+                    floorplan=floorplan_object,
+                    uuid=track["uuid"],
+                    name=track["name"],
+                    type=track["type"],
+                    cleaning_mode=(
+                        CleaningModeEnum(track["cleaning_mode"])
+                        if track["cleaning_mode"] != None else None
+                    ),
+                ))
+            account._floorplans.append(floorplan_object)
+        account._floorplans_initialized = data["floorplans_initialized"]
+
+        if revalidate:
+            threading.Thread(
+                target=account._revalidate, name="pyneato-revalidate", daemon=True
+            ).start()
+
+        return account
+
+    def _revalidate(self):
+        """Refresh restored data and swap it in once complete."""
+        fresh = Account(self._session)
+        fresh._robot_registry = self._robot_registry
+        fresh._floorplan_registry = self._floorplan_registry
+        try:
+            if self._userdata:
+                fresh.get_userdata()
+            fresh.refresh_robots()
+            if self._floorplans_initialized:
+                fresh.refresh_floorplans()
+        except (MyNeatoException, MyNeatoLoginException, MyNeatoRobotException) as ex:
+            _LOGGER.warning("Unable to revalidate restored account: %s", ex.message)
+            return
+        except MultipleInvalid as ex:
+            _LOGGER.warning("Bad response while revalidating restored account: %s", ex)
+            return
+
+        if fresh._userdata:
+            self._userdata = fresh._userdata
+        self._robots = fresh._robots
+        if fresh._floorplans_initialized:
+            self._floorplans = fresh._floorplans
 
     def get_userdata(self):
         resp = self._session.get("/users/me")
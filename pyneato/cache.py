@@ -0,0 +1,143 @@
+import fnmatch
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+import requests
+
+from .deadline import current_deadline
+from .exception import MyNeatoTimeoutException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTLS = {
+    "users/me": 3600,
+    "users/me/robots": 300,
+    "robots/*/floorplans": 300,
+    "maps/floorplans/*/tracks": 300,
+}
+
+
+def _normalize(path: str) -> str:
+    return path.strip("/")
+
+
+def _is_empty(response: requests.Response) -> bool:
+    try:
+        return not response.json()
+    except ValueError:
+        return False
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Cache for responses of idempotent GET requests.
+
+    Time to live is configured per path with fnmatch patterns, e.g.
+    ``{"robots/*/floorplans": 60}``; paths without a matching pattern use
+    ``default_ttl``. Empty results are cached for ``negative_ttl`` seconds
+    if given. Concurrent requests for the same path are coalesced into one.
+
+    A cache may be shared by several sessions: responses are kept apart by
+    the ``scope`` of the session, its endpoint and account.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = 0,
+        negative_ttl: Optional[float] = None,
+    ):
+        self._ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._default_ttl = default_ttl
+        self._negative_ttl = negative_ttl
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def ttl(self, path: str) -> float:
+        """
+        Return the time to live configured for a path.
+        """
+        path = _normalize(path)
+        for pattern, ttl in self._ttls.items():
+            if fnmatch.fnmatchcase(path, _normalize(pattern)):
+                return ttl
+
+        return self._default_ttl
+
+    def get(
+        self,
+        path: str,
+        fetch: Callable[[], requests.Response],
+        params=None,
+        scope: Hashable = None,
+    ) -> requests.Response:
+        """
+        Return the cached response for path or fetch it.
+
+        :param fetch: sends the request if the response is not cached
+        :param params: query parameters, part of the cache key
+        :param scope: identifies the session, responses are only shared within a scope
+        """
+        key = (scope, _normalize(path), tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                _LOGGER.debug("Cache hit for %s", path)
+                return entry[1]
+
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+
+        if not leader:
+            deadline = current_deadline()
+            if not inflight.done.wait(None if deadline is None else deadline.remaining()):
+                raise MyNeatoTimeoutException("Deadline exceeded waiting for %s." % path)
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.response
+
+        try:
+            inflight.response = fetch()
+        except Exception as ex:
+            inflight.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if inflight.error is None:
+                    ttl = self.ttl(path)
+                    if self._negative_ttl is not None and _is_empty(inflight.response):
+                        ttl = self._negative_ttl
+                    if ttl > 0:
+                        self._entries[key] = (time.monotonic() + ttl, inflight.response)
+            inflight.done.set()
+
+        return inflight.response
+
+    def invalidate(self, path: str = None, scope: Hashable = None) -> None:
+        """
+        Drop cached responses.
+
+        :param path: path or fnmatch pattern to drop, all responses if omitted
+        :param scope: only drop the responses of this scope, of all scopes if omitted
+        """
+        pattern = None if path is None else _normalize(path)
+        with self._lock:
+            for key in list(self._entries):
+                if scope is not None and key[0] != scope:
+                    continue
+                if pattern is None or fnmatch.fnmatchcase(key[1], pattern):
+                    del self._entries[key]
@@ -0,0 +1,337 @@
+"""
+Command line tool for a MyNeato account.
+
+Every subcommand works on all robots of the account concurrently and
+writes one JSON object per line to stdout.
+
+    pyneato robots
+    pyneato floorplans --tracks --images ./maps
+    pyneato states --interval 30
+    pyneato send pause --robot <serial>
+
+With ``--cache-ttl`` the access token and the robots of the account are
+kept in $XDG_CACHE_HOME/pyneato between runs, so repeated commands skip
+the login and the robot list.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .account import Account
+from .exception import MyNeatoException, MyNeatoLoginException, MyNeatoRobotException
+from .neato import Neato
+from .session import OrbitalPasswordSession
+
+ERRORS = (MyNeatoException, MyNeatoLoginException, MyNeatoRobotException)
+
+ABILITIES = {
+    "pause": "pause_cleaning",
+    "resume": "resume_cleaning",
+    "cancel": "cancel_cleaning",
+    "return-to-base": "return_to_base",
+    "find-me": "find_me",
+}
+
+_LOGGER = logging.getLogger(__name__)
+
+_output_lock = threading.Lock()
+
+
+def _emit(record: dict) -> None:
+    line = json.dumps(record, default=str)
+    with _output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def _robot_json(robot) -> dict:
+    return {
+        "serial": robot.serial,
+        "id": robot.id,
+        "name": robot.name,
+        "model_name": robot.model_name,
+        "firmware": robot.firmware,
+        "timezone": robot.timezone,
+        "birth_date": robot.birth_date,
+    }
+
+
+def _state_json(robot, state) -> dict:
+    details = state.details
+    return {
+        "serial": robot.serial,
+        "name": robot.name,
+        "state": state.state.value,
+        "action": state.action.value,
+        "available_commands": state.available_commands,
+        "charge": None if details is None else details.charge,
+        "is_charging": None if details is None else details.is_charging,
+        "is_docked": None if details is None else details.is_docked,
+    }
+
+
+def _error_json(robot, ex) -> dict:
+    message = ex.message if isinstance(ex, ERRORS) else "%s: %s" % (type(ex).__name__, ex)
+
+    return {"serial": robot.serial, "name": robot.name, "error": message}
+
+
+def _for_each(executor, robots, fn) -> int:
+    """Run fn for every robot concurrently and emit its records, return the number of failures."""
+    failures = 0
+    futures = {executor.submit(fn, robot): robot for robot in robots}
+    for future in as_completed(futures):
+        robot = futures[future]
+        try:
+            records = future.result()
+        except Exception as ex:  # pylint: disable=broad-except
+            # e.g. a schema error or a value unknown to an enum, only fails this robot
+            failures += 1
+            _emit(_error_json(robot, ex))
+            continue
+
+        for record in records:
+            _emit(record)
+
+    return failures
+
+
+def _robots(args, account, executor) -> int:
+    for robot in _select(args, account):
+        _emit(_robot_json(robot))
+
+    return 0
+
+
+def _floorplans(args, account, executor) -> int:
+    if args.images:
+        os.makedirs(args.images, exist_ok=True)
+
+    def dump(robot):
+        records = []
+        for floorplan in account.get_floorplan(robot):
+            record = {
+                "serial": robot.serial,
+                "uuid": floorplan.uuid,
+                "name": floorplan.name,
+                "rank_uuid": floorplan.rank_uuid,
+                "last_modified_at": floorplan.last_modified_at,
+            }
+            if args.tracks:
+                record["tracks"] = [
+                    {
+                        "uuid": track.uuid,
+                        "name": track.name,
+                        "type": track.type,
+                        "cleaning_mode": track.cleaning_mode,
+                    }
+                    for track in floorplan.tracks
+                ]
+            if args.images:
+                path = os.path.join(args.images, "%s.png" % floorplan.uuid)
+                with open(path, "wb") as image:
+                    image.write(floorplan.rank_image)
+                record["image"] = path
+            records.append(record)
+
+        return records
+
+    return _for_each(executor, _select(args, account), dump)
+
+
+def _states(args, account, executor) -> int:
+    robots = _select(args, account)
+    failures = 0
+    count = 0
+    while True:
+        failures += _for_each(
+            executor, robots, lambda robot: [_state_json(robot, robot.get_state())]
+        )
+        count += 1
+        if not args.interval or (args.count and count >= args.count):
+            return failures
+        time.sleep(args.interval)
+
+
+def _send(args, account, executor) -> int:
+    method = ABILITIES[args.ability]
+
+    def send(robot):
+        return [{
+            "serial": robot.serial,
+            "name": robot.name,
+            "ability": args.ability,
+            "success": getattr(robot, method)(),
+        }]
+
+    return _for_each(executor, _select(args, account), send)
+
+
+def _select(args, account) -> list:
+    robots = account.robots
+    if not args.robot:
+        return robots
+
+    return [robot for robot in robots if robot.serial in args.robot or robot.name in args.robot]
+
+
+def _add_common_arguments(parser, defaults: bool) -> None:
+    """
+    Add the options of all subcommands. Without defaults an option is only
+    set if given, so it does not override the same option given before the
+    subcommand.
+    """
+    def default(value):
+        return value if defaults else argparse.SUPPRESS
+
+    parser.add_argument("--email", default=default(os.environ.get("MYNEATO_USER")),
+                        help="account email, defaults to $MYNEATO_USER")
+    parser.add_argument("--password", default=default(os.environ.get("MYNEATO_PASSWORD")),
+                        help="account password, defaults to $MYNEATO_PASSWORD")
+    parser.add_argument("--token", default=default(os.environ.get("MYNEATO_TOKEN")),
+                        help="access token to use instead of logging in, defaults to $MYNEATO_TOKEN")
+    parser.add_argument("--endpoint", default=default(None),
+                        help="API endpoint to use instead of the vendor's")
+    parser.add_argument("--concurrency", type=int, default=default(8),
+                        help="maximum number of robots to talk to at the same time (default: 8)")
+    parser.add_argument("--cache-ttl", type=float, default=default(0),
+                        help="seconds to keep the login and robot list for later runs, 0 disables the cache")
+    parser.add_argument("--robot", action="append", default=default(None),
+                        help="serial or name of a robot to work on, may be repeated (default: all)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=default(False),
+                        help="log debug output to stderr")
+
+
+def _cache_path(args, vendor) -> str:
+    """
+    Return the file caching the account of args, one per endpoint and account.
+    """
+    account = "%s %s" % (vendor.endpoint, args.email or args.token)
+    directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(
+        directory, "pyneato", hashlib.sha256(account.encode()).hexdigest()[:16] + ".snapshot"
+    )
+
+
+def _load_account(session, path: str, ttl: float):
+    """
+    Return the account cached in path if it is younger than ttl seconds, otherwise None.
+    """
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, "rb") as cache:
+            return Account.restore(session, cache.read(), revalidate=False)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, zlib.error) as ex:
+        _LOGGER.warning("Ignoring unreadable cache %s: %s", path, ex)
+        return None
+
+
+def _save_account(account, path: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + ".tmp"
+        # The snapshot contains the access token
+        with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as cache:
+            cache.write(account.snapshot())
+        os.replace(temporary, path)
+    except OSError as ex:
+        _LOGGER.warning("Unable to write cache %s: %s", path, ex)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pyneato", description="Control the robots of a MyNeato account."
+    )
+    _add_common_arguments(parser, defaults=True)
+
+    # The options may also follow the subcommand, e.g. "send pause --robot <serial>"
+    common = argparse.ArgumentParser(add_help=False)
+    _add_common_arguments(common, defaults=False)
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("robots", parents=[common], help="list robots").set_defaults(run=_robots)
+
+    floorplans = commands.add_parser("floorplans", parents=[common], help="dump floorplans")
+    floorplans.add_argument("--tracks", action="store_true", help="include the tracks")
+    floorplans.add_argument("--images", metavar="DIR", help="write the rank images to DIR")
+    floorplans.set_defaults(run=_floorplans)
+
+    states = commands.add_parser("states", parents=[common], help="poll robot states")
+    states.add_argument("--interval", type=float, default=0,
+                        help="poll every INTERVAL seconds instead of once")
+    states.add_argument("--count", type=int, default=0,
+                        help="stop after COUNT polls, 0 polls until interrupted")
+    states.set_defaults(run=_states)
+
+    send = commands.add_parser("send", parents=[common], help="send an ability to robots")
+    send.add_argument("ability", choices=sorted(ABILITIES))
+    send.set_defaults(run=_send)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        format="%(levelname)s %(asctime)s - %(message)s",
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+    )
+
+    vendor = Neato()
+    if args.endpoint:
+        vendor = type("Endpoint", (Neato,), {"endpoint": args.endpoint})()
+
+    session = OrbitalPasswordSession(
+        args.email,
+        args.password,
+        access_token=args.token,
+        vendor=vendor,
+        lazy=True,
+    )
+
+    account = None
+    cache_path = None
+    if args.cache_ttl > 0 and (args.email or args.token):
+        cache_path = _cache_path(args, vendor)
+        account = _load_account(session, cache_path, args.cache_ttl)
+    if account is not None:
+        # A cache in use is not written again, so it still expires
+        cache_path = None
+    else:
+        account = Account(session)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            failures = args.run(args, account, executor)
+    except ERRORS as ex:
+        print("pyneato: %s" % ex.message, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away, e.g. "pyneato states | head"
+        sys.stdout = open(os.devnull, "w")
+        return 1
+
+    if cache_path:
+        _save_account(account, cache_path)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
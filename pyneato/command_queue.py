@@ -0,0 +1,151 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+from .enum import CleaningModeEnum, RobotAbilityEnum
+
+_LOGGER = logging.getLogger(__name__)
+
+ABILITY_COMMANDS = {
+    "cleaning.start": "start",
+    RobotAbilityEnum.CLEANING_PAUSE.value: "pause",
+    RobotAbilityEnum.CLEANING_RESUME.value: "resume",
+    RobotAbilityEnum.RETURN_TO_BASE.value: "return_to_base",
+}
+
+
+class CommandQueue:
+    """
+    Sends commands to one robot one after another.
+
+    A command which is submitted while an identical command is still
+    pending is collapsed into the pending one and shares its future.
+    Before a command is sent it is checked against the available commands
+    of the last state fetched with Robot.get_state, if that state is not
+    older than ``max_state_age`` seconds; unavailable commands resolve to
+    False without contacting the robot.
+    """
+
+    def __init__(self, robot, max_state_age: float = 30):
+        self._robot = robot
+        self._max_state_age = max_state_age
+        self._queue = deque()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, ability: str, send: Callable[[], bool], key: Hashable = None) -> Future:
+        """
+        Queue a command. send runs in a copy of the caller's context, so a
+        pyneato.deadline active while submitting also bounds the command.
+
+        :param ability: ability name of the command, used for gating
+        :param send: sends the command and returns whether it succeeded
+        :param key: identifies duplicate commands, defaults to the ability name
+        :return: future resolving to the result of send
+        """
+        key = ability if key is None else key
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                _LOGGER.debug("Collapsing duplicate command %s for %s", ability, self._robot.name)
+                return future
+
+            future = Future()
+            self._pending[key] = future
+            context = contextvars.copy_context()
+            self._queue.append((key, ability, lambda: context.run(send), future))
+
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="pyneato-commands-%s" % self._robot.serial, daemon=True
+                )
+                self._worker.start()
+
+        return future
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        self._worker = None
+                        return
+                    key, ability, send, future = self._queue.popleft()
+                    del self._pending[key]
+
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    if self._is_available(ability):
+                        try:
+                            result = send()
+                        finally:
+                            # The state changes with every command sent
+                            self._robot.last_state = None
+                    else:
+                        _LOGGER.debug("Skipping unavailable command %s for %s", ability, self._robot.name)
+                        result = False
+                except Exception as ex:  # pylint: disable=broad-except
+                    future.set_exception(ex)
+                else:
+                    future.set_result(result)
+        finally:
+            # Let the next submit start a new worker should this one ever die
+            with self._lock:
+                if self._worker is threading.current_thread():
+                    self._worker = None
+
+    def _is_available(self, ability: str) -> bool:
+        command = ABILITY_COMMANDS.get(ability)
+        state = self._robot.last_state
+        state_at = self._robot.last_state_at
+        if command is None or state is None or state_at is None:
+            return True
+
+        if time.monotonic() - state_at > self._max_state_age:
+            return True
+
+        return command in state.available_commands
+
+    def start_cleaning(
+        self,
+        floorplan,
+        tracks: list = None,
+        cleaning_mode=CleaningModeEnum.ECO,
+        nogo_enabled=True,
+    ) -> Future:
+        key = (
+            "cleaning.start",
+            floorplan.rank_uuid,
+            None if tracks is None else tuple(track.uuid for track in tracks),
+            cleaning_mode,
+            nogo_enabled,
+        )
+
+        return self.submit(
+            "cleaning.start",
+            lambda: self._robot.start_cleaning(floorplan, tracks, cleaning_mode, nogo_enabled)["success"],
+            key,
+        )
+
+    def pause_cleaning(self) -> Future:
+        return self.submit(RobotAbilityEnum.CLEANING_PAUSE.value, self._robot.pause_cleaning)
+
+    def resume_cleaning(self) -> Future:
+        return self.submit(RobotAbilityEnum.CLEANING_RESUME.value, self._robot.resume_cleaning)
+
+    def return_to_base(self) -> Future:
+        return self.submit(RobotAbilityEnum.RETURN_TO_BASE.value, self._robot.return_to_base)
+
+    def find_me(self) -> Future:
+        return self.submit(RobotAbilityEnum.FIND_ME.value, self._robot.find_me)
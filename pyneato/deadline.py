@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple, Union
+
+from .exception import MyNeatoTimeoutException
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30
+
+_current = contextvars.ContextVar("pyneato_deadline", default=None)
+
+
+class Deadline:
+    """
+    Point in time by which an operation, and every request it sends, has to be done.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.cancelled = False
+
+    def remaining(self) -> float:
+        if self.cancelled:
+            return 0
+
+        return max(self.expires_at - time.monotonic(), 0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cancel(self) -> None:
+        """
+        Let every further request made under this deadline fail immediately.
+        """
+        self.cancelled = True
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise MyNeatoTimeoutException("Operation was cancelled.")
+        if self.expired:
+            raise MyNeatoTimeoutException("Deadline exceeded.")
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Bound all requests sent inside the block to the given number of seconds.
+
+    Deadlines follow the context into asyncio tasks and nest: an inner
+    deadline never extends an outer one. Requests which would exceed the
+    deadline raise MyNeatoTimeoutException.
+    """
+    outer = _current.get()
+    inner = Deadline(seconds)
+    if outer is not None and outer.expires_at < inner.expires_at:
+        inner.expires_at = outer.expires_at
+
+    token = _current.set(inner)
+    try:
+        yield inner
+    finally:
+        _current.reset(token)
+
+
+def request_timeout(
+    connect: float = DEFAULT_CONNECT_TIMEOUT, read: float = DEFAULT_READ_TIMEOUT
+) -> Tuple[float, float]:
+    """
+    Return the (connect, read) timeout for the next request, capped by the current deadline.
+    """
+    current = _current.get()
+    if current is None:
+        return connect, read
+
+    # A single reading, the deadline may pass between two of them
+    remaining = current.remaining()
+    if remaining <= 0:
+        raise MyNeatoTimeoutException(
+            "Operation was cancelled." if current.cancelled else "Deadline exceeded."
+        )
+
+    return min(connect, remaining), min(read, remaining)
+
+
+async def run_async(fn, *args, timeout: Union[float, None] = None, **kwargs):
+    """
+    Run a blocking pyneato call in the default executor.
+
+    The call runs under a deadline of timeout seconds, if given. When the
+    awaiting task is cancelled the deadline is cancelled as well, so the
+    call stops before its next request instead of running on unnoticed.
+    """
+    if timeout is None:
+        outer = _current.get()
+        timeout = outer.remaining() if outer is not None else float("inf")
+
+    loop = asyncio.get_running_loop()
+
+    with deadline(timeout) as current:
+        context = contextvars.copy_context()
+        try:
+            return await loop.run_in_executor(
+                None, functools.partial(context.run, fn, *args, **kwargs)
+            )
+        except asyncio.CancelledError:
+            current.cancel()
+            raise
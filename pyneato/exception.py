@@ -17,3 +17,12 @@ class MyNeatoUnsupportedDevice(Exception):
     def __init__(self, message):
         Exception.__init__(self)
         self.message = message
+
+class MyNeatoTimeoutException(MyNeatoException):
+    def __init__(self, message):
+        MyNeatoException.__init__(self, message)
+
+class MyNeatoRobotTimeoutException(MyNeatoTimeoutException, MyNeatoRobotException):
+    """Timeout of a login or robot call, a MyNeatoRobotException like their other failures"""
+    def __init__(self, message):
+        MyNeatoTimeoutException.__init__(self, message)
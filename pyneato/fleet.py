@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+from .enum import RobotActionEnum, RobotStateEnum
+from .robot_state import RobotState
+
+
+@dataclass(frozen=True)
+class FleetSnapshot:
+    robots: int
+    states: Dict[RobotStateEnum, int]
+    actions: Dict[RobotActionEnum, int]
+    charge_sum: int
+    charge_count: int
+    docked: int
+    charging: int
+
+    @property
+    def average_charge(self) -> Optional[float]:
+        if not self.charge_count:
+            return None
+
+        return self.charge_sum / self.charge_count
+
+
+class FleetAggregate:
+    """
+    Counts of states and actions, charge and docking totals over many robots.
+
+    Every update replaces the contribution of one robot in constant time.
+    Attached robots report each state fetched with Robot.get_state. Updates
+    and snapshots may happen from different threads; a snapshot always
+    reflects a set of complete updates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contributions = {}
+        self._states = Counter()
+        self._actions = Counter()
+        self._charge_sum = 0
+        self._charge_count = 0
+        self._docked = 0
+        self._charging = 0
+
+    def __len__(self):
+        return len(self._contributions)
+
+    def attach(self, robot) -> None:
+        """
+        Update the aggregate with every state fetched for the robot.
+        """
+        robot.add_state_listener(self.update)
+        if robot.last_state is not None:
+            self.update(robot, robot.last_state)
+
+    def detach(self, robot) -> None:
+        robot.remove_state_listener(self.update)
+        self.remove(robot.serial)
+
+    def update(self, robot, state: RobotState) -> None:
+        self.update_state(robot.serial, state)
+
+    def update_state(self, key: Hashable, state: RobotState) -> None:
+        """
+        Replace the contribution of the robot identified by key.
+        """
+        details = state.details
+        contribution = (
+            state.state,
+            state.action,
+            None if details is None else details.charge,
+            details is not None and details.is_docked,
+            details is not None and details.is_charging,
+        )
+
+        with self._lock:
+            self._apply(self._contributions.get(key), -1)
+            self._apply(contribution, 1)
+            self._contributions[key] = contribution
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._apply(self._contributions.pop(key, None), -1)
+
+    def _apply(self, contribution, sign: int):
+        if contribution is None:
+            return
+
+        state, action, charge, docked, charging = contribution
+        self._states[state] += sign
+        self._actions[action] += sign
+        if charge is not None:
+            self._charge_sum += sign * charge
+            self._charge_count += sign
+        self._docked += sign * docked
+        self._charging += sign * charging
+
+    def snapshot(self) -> FleetSnapshot:
+        with self._lock:
+            return FleetSnapshot(
+                robots=len(self._contributions),
+                states={state: count for state, count in self._states.items() if count},
+                actions={action: count for action, count in self._actions.items() if count},
+                charge_sum=self._charge_sum,
+                charge_count=self._charge_count,
+                docked=self._docked,
+                charging=self._charging,
+            )
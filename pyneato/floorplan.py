@@ -1,7 +1,11 @@
 import base64
 import logging
+import time
+import weakref
 
+from .exception import MyNeatoException
 from .session import Session
+from .tracing import phase, traced
 from .enum import TrackTypeEnum, CleaningModeEnum
 
 from voluptuous import (
@@ -17,10 +21,11 @@ from voluptuous import (
     Url,
     Coerce,
 )
+from .schema import LazySchema
 
 _LOGGER = logging.getLogger(__name__)
 
-TRACK_SCHEMA = Schema(
+TRACK_SCHEMA = LazySchema(lambda: Schema(
     Any(
         {
             "track_uuid": str,
@@ -35,9 +40,22 @@ TRACK_SCHEMA = Schema(
         extra=ALLOW_EXTRA,
     ),
     extra=ALLOW_EXTRA,
-)
+))
 
 class Floorplan:
+    __slots__ = (
+        "_session",
+        "name",
+        "uuid",
+        "rank_uuid",
+        "robot_id",
+        "_tracks",
+        "last_modified_at",
+        "last_used",
+        "_rank_binary",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         session: Session,
@@ -46,22 +64,29 @@ class Floorplan:
         rank_uuid: str,
         rank_binary: str,
         last_modified_at: str,
+        robot_id: str = None,
     ):
         self._session = session
         self.name = name
         self.uuid = uuid
         self.rank_uuid = rank_uuid
+        self.robot_id = robot_id
         self._tracks = set()
         self.last_modified_at = last_modified_at
+        self.last_used = time.monotonic()
         self._rank_binary = rank_binary
 
     @property
     def rank_image(self) -> str:
         """
-        Get the binary image of the floorplan
+        Get the binary image of the floorplan, reloading it if it was evicted
 
         :return: The image of the floorplan
         """
+        self.last_used = time.monotonic()
+        if self._rank_binary == None:
+            self.reload()
+
         return base64.b64decode(self._rank_binary)
 
     @property
@@ -71,11 +96,57 @@ class Floorplan:
 
         :return:
         """
+        self.last_used = time.monotonic()
         if not self._tracks:
             self.refresh_tracks()
 
         return self._tracks
 
+    @property
+    def is_evicted(self) -> bool:
+        return self._rank_binary == None
+
+    def evict(self) -> None:
+        """
+        Drop the rank image and tracks, they are loaded again on next access
+        """
+        if self.robot_id == None:
+            _LOGGER.debug("Floorplan %s can not be reloaded, keeping it", self.uuid)
+            return
+
+        self._rank_binary = None
+        self._tracks = set()
+
+    def update(self, name: str | None, rank_uuid: str, rank_binary: str, last_modified_at: str) -> None:
+        """
+        Update the floorplan with data fetched from the API
+        """
+        if self.rank_uuid != rank_uuid or self.last_modified_at != last_modified_at:
+            self._tracks = set()
+
+        self.name = name
+        self.rank_uuid = rank_uuid
+        self.last_modified_at = last_modified_at
+        self._rank_binary = rank_binary
+
+    def reload(self) -> None:
+        """
+        Fetch the rank image of this floorplan again
+        """
+        resp = self._session.get("/robots/%s/floorplans"%self.robot_id)
+
+        for floorplan in resp.json():
+            if floorplan["floorplan_uuid"] == self.uuid:
+                self.update(
+                    floorplan["name"],
+                    floorplan["rank_uuid"],
+                    floorplan["processed_rank_binary"],
+                    floorplan["last_modified_at"],
+                )
+                return
+
+        raise MyNeatoException("Floorplan %s does not exist anymore." % self.uuid)
+
     def __str__(self):
         return "Name: %s, UUID: %s, RankID: %s" % (
             self.name,
@@ -83,10 +154,15 @@ class Floorplan:
             self.rank_uuid,
         )
 
+    @traced("Floorplan.refresh_tracks")
     def refresh_tracks(self):
-        resp = self._session.get("maps/floorplans/%s/tracks"%(self.uuid))
+        with phase("request"):
+            resp = self._session.get("maps/floorplans/%s/tracks"%(self.uuid))
+        with phase("decode"):
+            data = resp.json()
 
-        for track in resp.json():
+        tracks = set()
+        for track in data:
             if track["name"] == None:
                 continue
 
@@ -95,28 +171,41 @@ class Floorplan:
                 if None != track["cleaning_mode"]:
                     cleaning_mode = CleaningModeEnum(track["cleaning_mode"])
 
-                TRACK_SCHEMA(track)
-                track_object = Track(
-                    floorplan=self,
-                    uuid=track["track_uuid"],
-                    name=track["name"],
-                    type=track["type"],
-                    cleaning_mode=cleaning_mode
-                )
-
-                self._tracks.add(track_object)
+                with phase("validate"):
+                    TRACK_SCHEMA(track)
+                with phase("construct"):
+                    track_object = Track(
+                        floorplan=self,
+                        uuid=track["track_uuid"],
+                        name=track["name"],
+                        type=track["type"],
+                        cleaning_mode=cleaning_mode
+                    )
+
+                tracks.add(track_object)
             except MultipleInvalid as ex:
                 _LOGGER.warning(
                     "Bad response from tracks endpoint: %s. Got: %s", ex, track
                 )
                 continue
 
+        self._tracks = tracks
+
 
 class Track:
+    __slots__ = ("_floorplan", "uuid", "name", "type", "cleaning_mode")
+
     def __init__(self, floorplan: Floorplan, uuid: str, name: str, type: str, cleaning_mode: CleaningModeEnum):
         """"""
-        self.floorplan = Floorplan
+        self._floorplan = weakref.ref(floorplan)
         self.uuid = uuid
         self.name = name
         self.type = type
         self.cleaning_mode = cleaning_mode
+
+    @property
+    def floorplan(self) -> Floorplan | None:
+        """
+        Return the floorplan of this track, None once the floorplan was dropped
+        """
+        return self._floorplan()
@@ -0,0 +1,148 @@
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent requests of one kind.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Return the given percentile (0..1) of the recorded latencies or None without samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+
+        index = min(math.ceil(percentile * len(samples)) - 1, len(samples) - 1)
+
+        return samples[max(index, 0)]
+
+
+class HedgePolicy:
+    """
+    Sends a second request for an idempotent read if the first one did not
+    answer within the ``percentile`` of recent latencies, and returns
+    whichever response arrives first.
+
+    Hedging starts once ``min_samples`` latencies were recorded. Extra
+    requests are limited by a token bucket: every hedgeable request adds
+    ``budget`` tokens, e.g. 0.05 for at most 5% more requests, and a hedge
+    takes one. The bucket holds at most ``burst`` tokens, so a long healthy
+    period does not save up a flood of hedges for when latency spikes.
+
+    Requests which can not be hedged run on the calling thread. The others
+    run on a thread of their own each, so the concurrency of reads is not
+    capped by a pool and the hedge delay only counts time spent on the
+    request itself.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        burst: float = 5,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self.requests = 0
+        self.hedged = 0
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def _can_hedge(self) -> bool:
+        with self._lock:
+            return self._tokens >= 1
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedged += 1
+
+            return True
+
+    @staticmethod
+    def _start(fn: Callable, latency: LatencyTracker) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        context = contextvars.copy_context()
+
+        def run():
+            start = time.monotonic()
+            try:
+                result = context.run(fn)
+            except BaseException as ex:  # pylint: disable=broad-except
+                future.set_exception(ex)
+            else:
+                latency.record(time.monotonic() - start)
+                future.set_result(result)
+
+        # start() returns once the thread runs, so the hedge delay starts with the request
+        threading.Thread(target=run, name="pyneato-hedge", daemon=True).start()
+
+        return future
+
+    def call(self, fn: Callable, latency: LatencyTracker):
+        """
+        Run fn, hedging it with a second call if it is slow.
+
+        :param latency: tracker of the kind of request fn sends
+        :return: the result of the first call to complete successfully
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+
+        delay = latency.percentile(self.percentile) if len(latency) >= self.min_samples else None
+
+        if delay is None or not self._can_hedge():
+            start = time.monotonic()
+            result = fn()
+            latency.record(time.monotonic() - start)
+
+            return result
+
+        primary = self._start(fn, latency)
+        if not wait([primary], timeout=delay).not_done:
+            return primary.result()
+
+        if not self._acquire():
+            return primary.result()
+
+        _LOGGER.debug("Hedging request after %.3fs", delay)
+        pending = {primary, self._start(fn, latency)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+
+        raise error
@@ -0,0 +1,215 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .account import Account
+from .exception import MyNeatoException, MyNeatoLoginException, MyNeatoRobotException
+from .neato import Vendor, Neato
+from .robot import Robot
+from .session import OrbitalPasswordSession
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _ManagedAccount:
+    def __init__(self, email: str, password: str, access_token: str = None):
+        self.email = email
+        self.password = password
+        self.access_token = access_token
+        self.session = None
+        self.account = None
+        self.last_used = 0.0
+
+
+class AccountManager:
+    """
+    Holds the sessions of many MyNeato accounts.
+
+    All sessions share one connection pool and one worker pool; cookies are
+    kept per account. Sessions are
+    created and logged in on first use and dropped again once they were idle
+    for longer than ``idle_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        vendor: Vendor = Neato(),
+        max_workers: int = 16,
+        pool_maxsize: int = 64,
+        idle_timeout: Optional[float] = None,
+    ):
+        self._vendor = vendor
+        self._idle_timeout = idle_timeout
+        self._accounts: Dict[str, _ManagedAccount] = {}
+        self._lock = threading.RLock()
+
+        self._adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __contains__(self, key: str):
+        return key in self._accounts
+
+    @property
+    def keys(self) -> List[str]:
+        """
+        Return the keys of all registered accounts.
+        """
+        with self._lock:
+            return list(self._accounts)
+
+    def add(self, key: str, email: str, password: str, access_token: str = None) -> None:
+        """
+        Register the credentials of an account. No request is sent until the account is used.
+
+        :param key: name to refer to the account
+        """
+        with self._lock:
+            if key in self._accounts:
+                raise ValueError("Account %s is already registered" % key)
+            self._accounts[key] = _ManagedAccount(email, password, access_token)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._accounts.pop(key)
+
+    def session(self, key: str) -> OrbitalPasswordSession:
+        """
+        Return the session of an account, creating it if necessary.
+        """
+        with self._lock:
+            entry = self._accounts[key]
+            if entry.session is None:
+                _LOGGER.debug("Creating session for %s", key)
+                entry.session = OrbitalPasswordSession(
+                    entry.email,
+                    entry.password,
+                    access_token=entry.access_token,
+                    vendor=self._vendor,
+                    http=self._new_http(),
+                    lazy=True,
+                )
+                entry.account = Account(entry.session)
+            entry.last_used = time.monotonic()
+
+            return entry.session
+
+    def _new_http(self) -> requests.Session:
+        """
+        Return a requests session using the shared connection pool. Every
+        account gets its own, a shared cookie jar would send the cookies of
+        one account with the requests of all others.
+        """
+        http = requests.Session()
+        http.mount("https://", self._adapter)
+        http.mount("http://", self._adapter)
+
+        return http
+
+    def account(self, key: str) -> Account:
+        """
+        Return the account object of an account, creating its session if necessary.
+        """
+        with self._lock:
+            self.session(key)
+
+            return self._accounts[key].account
+
+    def login_all(self, keys: Iterable[str] = None) -> Dict[str, Exception]:
+        """
+        Login all (or the given) accounts concurrently.
+
+        :return: exceptions of the accounts which could not be logged in, by key
+        """
+        keys = self.keys if keys is None else list(keys)
+        sessions = {key: self.session(key) for key in keys}
+        futures = {
+            self._executor.submit(contextvars.copy_context().run, session.login): key
+            for key, session in sessions.items()
+        }
+
+        failed = {}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+                self._accounts[key].access_token = sessions[key].access_token
+            except (MyNeatoException, MyNeatoLoginException, MyNeatoRobotException) as ex:
+                _LOGGER.warning("Unable to login account %s: %s", key, ex.message)
+                failed[key] = ex
+
+        return failed
+
+    def evict_idle(self, idle_timeout: float = None) -> List[str]:
+        """
+        Drop the sessions and cached data of accounts which were not used recently.
+        Access tokens are kept so the session can be recreated without a new login.
+
+        :param idle_timeout: seconds since last use, defaults to the manager's idle_timeout
+        :return: keys of the evicted accounts
+        """
+        idle_timeout = self._idle_timeout if idle_timeout is None else idle_timeout
+        if idle_timeout is None:
+            return []
+
+        evicted = []
+        deadline = time.monotonic() - idle_timeout
+        with self._lock:
+            for key, entry in self._accounts.items():
+                if entry.session is None or entry.last_used > deadline:
+                    continue
+
+                entry.access_token = entry.session.access_token
+                entry.session = None
+                entry.account = None
+                evicted.append(key)
+
+        _LOGGER.debug("Evicted %d idle sessions", len(evicted))
+
+        return evicted
+
+    def iter_robots(self, keys: Iterable[str] = None) -> Iterator[Tuple[str, Robot]]:
+        """
+        Iterate over the robots of all (or the given) accounts.
+        Robots are fetched concurrently and yielded as soon as their account answered.
+
+        :return: iterator of (account key, robot)
+        """
+        self.evict_idle()
+
+        keys = self.keys if keys is None else list(keys)
+        futures = {
+            self._executor.submit(
+                contextvars.copy_context().run, lambda account: account.robots, self.account(key)
+            ): key
+            for key in keys
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                robots = future.result()
+            except (MyNeatoException, MyNeatoLoginException, MyNeatoRobotException) as ex:
+                _LOGGER.warning("Unable to get robots of account %s: %s", key, ex.message)
+                continue
+
+            for robot in robots:
+                yield key, robot
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._adapter.close()
@@ -9,10 +9,13 @@ class Vendor:
     endpoint: str
     auth_endpoint: str
     mime_version: str = "application/vnd.neato.orbital-http.v1+json"
+    # Equivalent endpoints, e.g. regional ones, to route between
+    endpoints: tuple = ()
 
 class Neato(Vendor):
     name = "neato"
     friendly_name: str = "Neato"
     endpoint = "https://orbital.neatocloud.com/"
+    endpoints = ("https://orbital.neatocloud.com/",)
     auth_endpoint = "https://orbital.neatocloud.com/vendors/neato/sessions"
     mime_version: str = "application/vnd.neato.orbital-http.v1+json"
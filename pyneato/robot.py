@@ -1,6 +1,8 @@
-import re
 import logging
+import threading
+import time
 import requests
+from urllib.parse import urljoin
 
 from voluptuous import (
     ALLOW_EXTRA,
@@ -20,11 +22,15 @@ from .neato import Neato
 from .enum import CleaningModeEnum, NavigationModeEnum, RobotAbilityEnum, RobotBaseTypeEnum, RobotBagStatusEnum, RobotActionEnum, RobotStateEnum
 from .floorplan import Floorplan, Track
 from .robot_state import RobotState, RobotStateDetail, RobotStateCleaningCenter
-from .exception import MyNeatoRobotException
+from .exception import MyNeatoRobotException, MyNeatoRobotTimeoutException, MyNeatoTimeoutException
+from .subscription import StateSubscription
+from .command_queue import CommandQueue
+from .schema import LazySchema
+from .tracing import phase, traced
 
 _LOGGER = logging.getLogger(__name__)
 
-RUN_SCHEMA = Schema(
+RUN_SCHEMA = LazySchema(lambda: Schema(
     {
         "map": {
             "nogo_enabled": bool,
@@ -36,23 +42,23 @@ RUN_SCHEMA = Schema(
             "navigation_mode": Coerce(CleaningModeEnum)
         }
     }
-)
+))
 
-CLEANING_SCHEMA = Schema(
+CLEANING_SCHEMA = LazySchema(lambda: Schema(
     {
         "ability": str,
         "force_floorplan": bool,
-        "runs": [RUN_SCHEMA]
+        "runs": [RUN_SCHEMA.schema]
     }
-)
+))
 
-ABILITY_SCHEMA = Schema(
+ABILITY_SCHEMA = LazySchema(lambda: Schema(
     {
         'ability': str,
     }
-)
+))
 
-STATE_SCHEMA = Schema(
+STATE_SCHEMA = LazySchema(lambda: Schema(
     {
         Required('ability'): Equal(RobotAbilityEnum.STATE_SHOW),
         'action': str,
@@ -93,19 +99,48 @@ STATE_SCHEMA = Schema(
         'errors': Any(None),
         'state': str
     }
-)
+))
 
-ROBOT_INFO_SCHEMA = Schema(
+ROBOT_INFO_SCHEMA = LazySchema(lambda: Schema(
     {
         'ability': str,
         'firmware': str,
         'serial_number': str,
     }
+))
+
+# Guards the lazy creation of Robot.commands; one lock instead of one per robot
+_COMMANDS_LOCK = threading.Lock()
+
+IDEMPOTENT_ABILITIES = (
+    RobotAbilityEnum.STATE_SHOW.value,
+    RobotAbilityEnum.INFO.value,
 )
 
 class Robot:
     """Data and methods for interacting with a Neato vacuum robot"""
 
+    __slots__ = (
+        "_session",
+        "name",
+        "vendor",
+        "_vendor_code",
+        "serial",
+        "id",
+        "user_id",
+        "endpoint",
+        "model_name",
+        "firmware",
+        "timezone",
+        "birth_date",
+        "last_state",
+        "last_state_at",
+        "_commands",
+        "_state_listeners",
+        "_url",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         session,
@@ -129,14 +164,12 @@ class Robot:
         self.firmware = None
         self.timezone = None
         self.birth_date = None
+        self.last_state = None
+        self.last_state_at = None
+        self._commands = None
+        self._state_listeners = []
 
-        self._url = "{endpoint}/vendors/{vendor_code}/robots/{serial}/messages".format(
-            endpoint=re.sub(":\d+", "", endpoint.rstrip('/')),
-            vendor_code=vendor_code,
-            serial=self.serial,
-        )
-        self._headers = session.headers
-        self._headers["Accept"] = vendor.mime_version
+        self._url = self._message_url(endpoint)
 
     def __str__(self):
         return "Name: %s, Serial: %s, ID: %s UserID: %s" % (
@@ -146,20 +179,71 @@ class Robot:
             self.user_id,
         )
 
+    def _message_url(self, endpoint: str) -> str:
+        return urljoin(
+            endpoint,
+            "vendors/{vendor_code}/robots/{serial}/messages".format(
+                vendor_code=self._vendor_code,
+                serial=self.serial,
+            ),
+        )
+
+    def _probe(self, endpoint: str, timeout: float) -> None:
+        """
+        Ask for the state of this robot through endpoint, to rank the endpoints for it.
+        """
+        self._session.http.post(
+            self._message_url(endpoint) + "?ability=%s"%RobotAbilityEnum.STATE_SHOW.value,
+            json={"ability": RobotAbilityEnum.STATE_SHOW.value},
+            headers=self._session.generate_headers({"Accept": self.vendor.mime_version}),
+            timeout=timeout,
+        ).raise_for_status()
+
+    @traced("Robot._message")
     def _message(self, message: str, json: dict, schema: Schema):
         """
         Sends message to robot with data from parameter 'json'
         :param json: dict containing data to send
         :return: server response
         """
-        try:
-            response = requests.post(
-                self._url + "?ability=%s"%message,
+        def post(url):
+            response = self._session.http.post(
+                url + "?ability=%s"%message,
                 json=json,
-                headers=self._headers,
+                headers=self._session.generate_headers({"Accept": self.vendor.mime_version}),
+                timeout=self._session.timeout(),
             )
             response.raise_for_status()
-            schema(response.json())
+
+            return response
+
+        def send():
+            if getattr(self._session, "router", None) is None:
+                return post(self._url)
+
+            # Commands are only repeated on another endpoint if they were not sent
+            return self._session.routed(
+                lambda endpoint: post(self._message_url(endpoint)),
+                key=self.serial,
+                idempotent=message in IDEMPOTENT_ABILITIES,
+                probe=self._probe,
+            )
+
+        try:
+            with phase("request"):
+                response = self._session.send(message, send, idempotent=message in IDEMPOTENT_ABILITIES)
+            with phase("decode"):
+                data = response.json()
+            with phase("validate"):
+                schema(data)
+        except requests.exceptions.Timeout as ex:
+            _LOGGER.warning("Timed out communicating with robot: %s"%(
+                ex
+            ))
+            raise MyNeatoRobotTimeoutException("Timed out communicating with robot") from ex
+        except MyNeatoTimeoutException as ex:
+            # The deadline passed before the request was sent
+            raise MyNeatoRobotTimeoutException(ex.message) from ex
         except (
             requests.exceptions.ConnectionError,
             requests.exceptions.HTTPError,
@@ -225,8 +309,8 @@ class Robot:
             )
 
         return {
-            result: result == ability_name,
-            response: response
+            "success": result == ability_name,
+            "response": response
         }
 
     def _base_message(self, message: str, schema: Schema):
@@ -282,6 +366,16 @@ class Robot:
             if available:
                 state.available_commands.append(command)
 
+        # last_state_at first, readers check last_state before its age
+        self.last_state_at = time.monotonic()
+        self.last_state = state
+
+        for listener in list(self._state_listeners):
+            try:
+                listener(self, state)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("State listener failed for %s", self.name)
+
         return state
 
     def info_robot(self):
@@ -311,6 +405,43 @@ class Robot:
 
         return result["success"]
 
+    def add_state_listener(self, listener) -> None:
+        """
+        Call listener(robot, state) with every state fetched by get_state.
+        """
+        self._state_listeners.append(listener)
+
+    def remove_state_listener(self, listener) -> None:
+        self._state_listeners.remove(listener)
+
+    @property
+    def commands(self) -> CommandQueue:
+        """
+        Queue which sends commands to this robot one after another,
+        collapsing duplicates and skipping commands the robot does not accept.
+        """
+        if self._commands is None:
+            with _COMMANDS_LOCK:
+                if self._commands is None:
+                    self._commands = CommandQueue(self)
+
+        return self._commands
+
+    def subscribe(self, callback=None, **kwargs) -> StateSubscription:
+        """
+        Start delivering state updates of this robot.
+
+        :param callback: called as callback(robot, state) for every changed state
+        :return: the subscription, stop it with subscription.stop(). It is started
+            right away if callback is given, otherwise by ``async for``, so
+            an async consumer does not miss the first updates.
+        """
+        subscription = StateSubscription([self], callback, **kwargs)
+        if callback is not None:
+            subscription.start()
+
+        return subscription
+
     @property
     def state(self):
         return self.get_state()
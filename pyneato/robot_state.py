@@ -3,10 +3,10 @@ from enum import Enum
 from .enum import RobotStateEnum, RobotActionEnum, RobotBaseTypeEnum, RobotBagStatusEnum
 
 class RobotState:
-    def __init__(self, action: RobotActionEnum, state: RobotStateEnum, available_commands: List[str] = []):
+    def __init__(self, action: RobotActionEnum, state: RobotStateEnum, available_commands: List[str] = None):
         self.action = action
         self.state = state
-        self.available_commands = available_commands
+        self.available_commands = [] if available_commands is None else available_commands
         self.cleaning_center = None
         self.details = None
 
@@ -0,0 +1,150 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+import requests
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EndpointRouter:
+    """
+    Chooses the fastest of several equivalent API endpoints, e.g. regional ones.
+
+    Without a probe, endpoints are ranked for the whole client by the
+    latency of a HEAD request; any HTTP response counts as reachable. A key
+    (a robot serial, ...) selected with a probe is ranked by timing the
+    probe, e.g. a cheap call to that robot, through every endpoint, so
+    robots in different regions can use different endpoints. The chosen
+    endpoint is pinned per key for ``ttl`` seconds. An endpoint reported as
+    failed is skipped for ``cooldown`` seconds and keys pinned to it fail
+    over to the next fastest endpoint.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[str],
+        http: Optional[requests.Session] = None,
+        probe_path: str = "",
+        probe_timeout: float = 2,
+        ttl: float = 3600,
+        cooldown: float = 60,
+    ):
+        self.endpoints = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("At least one endpoint is required")
+
+        self._http = http if http is not None else requests.Session()
+        self._probe_path = probe_path
+        self._probe_timeout = probe_timeout
+        self._ttl = ttl
+        self._cooldown = cooldown
+        self._latencies: Dict[str, float] = {}
+        self._probed_at = None
+        self._failed: Dict[str, float] = {}
+        self._pinned: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _head(self, endpoint: str, timeout: float) -> None:
+        self._http.head(endpoint.rstrip("/") + "/" + self._probe_path.lstrip("/"), timeout=timeout)
+
+    def _measure(self, probe: Callable[[str, float], object], endpoints: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Time probe(endpoint, timeout) through all endpoints concurrently, None for failed ones.
+        """
+        def measure(endpoint):
+            started = time.monotonic()
+            try:
+                probe(endpoint, self._probe_timeout)
+            except Exception as ex:  # pylint: disable=broad-except
+                _LOGGER.debug("Probe of endpoint %s failed: %s", endpoint, ex)
+                return None
+
+            return time.monotonic() - started
+
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            return dict(zip(
+                endpoints, executor.map(lambda endpoint: context.copy().run(measure, endpoint), endpoints)
+            ))
+
+    def probe(self) -> Dict[str, Optional[float]]:
+        """
+        Measure the latency of all endpoints from this client.
+
+        :return: latency in seconds by endpoint, None for unreachable endpoints
+        """
+        if len(self.endpoints) == 1:
+            results = {self.endpoints[0]: 0.0}
+        else:
+            results = self._measure(self._head, self.endpoints)
+
+        with self._lock:
+            self._latencies = {
+                endpoint: latency for endpoint, latency in results.items() if latency is not None
+            }
+            self._probed_at = time.monotonic()
+            self._pinned = {key: pinned for key, pinned in self._pinned.items() if pinned[2]}
+
+        _LOGGER.debug("Probed endpoints: %s", results)
+
+        return results
+
+    def select(self, key: Hashable = None, probe: Callable[[str, float], object] = None) -> str:
+        """
+        Return the endpoint to use for key.
+
+        :param probe: called as probe(endpoint, timeout) to rank the endpoints
+            for key, e.g. a cheap idempotent call to a robot; without it the
+            endpoints are ranked for the whole client
+        """
+        now = time.monotonic()
+        with self._lock:
+            pinned = self._pinned.get(key)
+            if pinned is not None and pinned[1] > now and self._is_healthy(pinned[0], now):
+                return pinned[0]
+            healthy = [endpoint for endpoint in self.endpoints if self._is_healthy(endpoint, now)]
+            stale = self._probed_at is None or self._probed_at + self._ttl <= now
+
+        if probe is not None and len(healthy) > 1:
+            latencies = {
+                endpoint: latency
+                for endpoint, latency in self._measure(probe, healthy).items()
+                if latency is not None
+            }
+            if latencies:
+                endpoint = min(latencies, key=latencies.get)
+                _LOGGER.debug("Routing %s to %s: %s", key, endpoint, latencies)
+                with self._lock:
+                    self._pinned[key] = (endpoint, now + self._ttl, True)
+
+                return endpoint
+
+        if stale:
+            self.probe()
+
+        with self._lock:
+            ranked = sorted(
+                healthy or self.endpoints,
+                key=lambda endpoint: self._latencies.get(endpoint, float("inf")),
+            )
+            endpoint = ranked[0]
+            self._pinned[key] = (endpoint, now + self._ttl, False)
+
+            return endpoint
+
+    def _is_healthy(self, endpoint: str, now: float) -> bool:
+        return self._failed.get(endpoint, 0) <= now
+
+    def report_failure(self, endpoint: str) -> None:
+        """
+        Skip endpoint for a while and move the keys pinned to it elsewhere.
+        """
+        _LOGGER.warning("Endpoint %s failed, failing over", endpoint)
+        with self._lock:
+            self._failed[endpoint] = time.monotonic() + self._cooldown
+            for key in [key for key, pinned in self._pinned.items() if pinned[0] == endpoint]:
+                del self._pinned[key]
@@ -0,0 +1,21 @@
+from typing import Callable
+
+
+class LazySchema:
+    """
+    Validator which builds its voluptuous schema on first use.
+    """
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._schema = None
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._schema = self._factory()
+
+        return self._schema
+
+    def __call__(self, data):
+        return self.schema(data)
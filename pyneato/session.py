@@ -4,10 +4,26 @@ import os
 import os.path
 import requests
 import logging
+import threading
+import time
+from types import MappingProxyType
 from typing import Callable, Dict, Optional
 
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .cache import ResponseCache
+from .deadline import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, request_timeout
+from .hedging import HedgePolicy, LatencyTracker
+from .routing import EndpointRouter
+from .tracing import add_phase, traced
 from .neato import Vendor, Neato
-from .exception import MyNeatoException, MyNeatoLoginException, MyNeatoRobotException
+from .exception import (
+    MyNeatoException,
+    MyNeatoLoginException,
+    MyNeatoRobotException,
+    MyNeatoRobotTimeoutException,
+    MyNeatoTimeoutException,
+)
 
 try:
     from urllib.parse import urljoin
@@ -16,12 +32,85 @@ except ImportError:
 
 _LOGGER = logging.getLogger(__name__)
 
+
+def _failed_to_connect(ex: requests.exceptions.RequestException) -> bool:
+    """
+    Return whether a request failed while connecting, i.e. before anything was sent.
+    A ConnectionError may also be raised after the request was written, e.g.
+    when the server closed the connection without responding.
+    """
+    if isinstance(ex, requests.exceptions.ConnectTimeout):
+        return True
+
+    reason = ex.args[0] if ex.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+
+    # Includes NameResolutionError
+    return isinstance(reason, NewConnectionError)
+
+
+def _path_kind(path: str) -> str:
+    """
+    Return path with its ids replaced by *, e.g. robots/*/floorplans.
+    """
+    return "/".join(
+        "*" if any(char.isdigit() for char in segment) else segment
+        for segment in path.strip("/").split("/")
+    )
+
+
 class Session:
-    def __init__(self, vendor: Vendor):
-        """Initialize the session."""
+    """
+    Connection to the Orbital API.
+
+    A session may be shared between threads: its headers are read-only and
+    every request gets its own copy from generate_headers, logins and token
+    refreshes are serialized by a lock and the optional response cache is
+    thread safe. Robot, Account and Floorplan objects only read from the
+    session and may be used from several threads as well.
+    Account.refresh_robots, Account.refresh_floorplans, Account.get_floorplan
+    and Floorplan.refresh_tracks build a new list (or set) and then swap it
+    in, so a thread iterating over Account.robots, Account.floorplans or
+    Floorplan.tracks keeps seeing the old collection until it reads the
+    property again.
+    """
+
+    def __init__(
+        self,
+        vendor: Vendor,
+        http: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        hedge: Optional[HedgePolicy] = None,
+        router: Optional[EndpointRouter] = None,
+    ):
+        """
+        Initialize the session.
+
+        :param http: connection pool to send requests through, may be shared between sessions
+        :param cache: cache for responses of GET requests, disabled if omitted
+        :param connect_timeout: upper bound in seconds for connecting, lowered by a pyneato.deadline
+        :param read_timeout: upper bound in seconds for waiting on the server, lowered by a pyneato.deadline
+        :param hedge: policy for hedging slow idempotent reads, disabled if omitted
+        :param router: chooses between endpoints, created if the vendor lists several endpoints
+        """
         self.vendor = vendor
+        self.http = http if http is not None else requests.Session()
         self.endpoint = vendor.endpoint
-        self.headers = {"Accept": vendor.mime_version}
+        if router is None and len(vendor.endpoints) > 1:
+            router = EndpointRouter(vendor.endpoints, http=self.http)
+        self.router = router
+        self.cache = cache
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.hedge = hedge
+        # Opt-in pyneato.tracing.Tracer receiving phase timings
+        self.tracer = None
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self._latencies_lock = threading.Lock()
+        self.headers = MappingProxyType({"Accept": vendor.mime_version})
         self.access_token = None
         self.is_active = False
 
@@ -29,29 +118,171 @@ class Session:
         """Send a GET request to the specified path."""
         raise NotImplementedError
 
-    def urljoin(self, path):
-        return urljoin(self.endpoint, path)
+    def routed(self, fn: Callable, key=None, idempotent: bool = False, probe: Callable = None):
+        """
+        Call fn with the endpoint chosen for key. If the endpoint can not
+        be reached, it is reported to the router and fn is retried once
+        with the next endpoint. Account requests are routed for the whole
+        client, robot messages per robot.
+
+        :param probe: ranks the endpoints for key, see EndpointRouter.select
+        :param idempotent: whether fn may be repeated once the request may
+            have reached the server. Otherwise only requests which failed
+            while connecting fail over, since a request which timed out or
+            lost its connection afterwards may already have been carried out.
+        """
+        if self.router is None:
+            return fn(self.endpoint)
+
+        endpoint = self.router.select(key, probe)
+        try:
+            return fn(endpoint)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as ex:
+            if not idempotent and not _failed_to_connect(ex):
+                raise
+            self.router.report_failure(endpoint)
+            fallback = self.router.select(key, probe)
+            if fallback == endpoint:
+                raise
+
+            return fn(fallback)
+
+    @property
+    def cache_scope(self):
+        """
+        Key which keeps the cached responses of this session apart from other
+        sessions sharing the cache.
+        """
+        return self.endpoint, self.access_token
+
+    def invalidate(self, path: str = None) -> None:
+        """
+        Drop cached responses of the given path (or fnmatch pattern) or of all paths.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(path, scope=self.cache_scope)
+
+    def timeout(self):
+        """
+        Return the (connect, read) timeout for the next request.
+        Raises MyNeatoTimeoutException if the current deadline has passed.
+        """
+        return request_timeout(self.connect_timeout, self.read_timeout)
+
+    def latency(self, name: str) -> LatencyTracker:
+        """
+        Return the latency statistics of the requests of the given kind.
+        """
+        with self._latencies_lock:
+            if name not in self.latencies:
+                self.latencies[name] = LatencyTracker()
+
+            return self.latencies[name]
+
+    def send(self, name: str, fn: Callable, idempotent: bool = False):
+        """
+        Send a request through fn, recording its latency under name.
+        Idempotent requests are hedged if the session has a hedge policy.
+        """
+        latency = self.latency(name)
+        if idempotent and self.hedge is not None:
+            return self.hedge.call(fn, latency)
+
+        start = time.monotonic()
+        result = fn()
+        latency.record(time.monotonic() - start)
+
+        return result
+
+    def urljoin(self, path, endpoint: str = None):
+        return urljoin(self.endpoint if endpoint is None else endpoint, path)
 
     def generate_headers(
-        self, custom_headers: Optional[Dict[str, str]] = None
+        self, custom_headers: Optional[Dict[str, str]] = None, access_token: Optional[str] = None
     ) -> Dict[str, str]:
-        """Merge self.headers with custom headers if necessary."""
-        if not custom_headers:
-            return self.headers
+        """
+        Return a new dict of self.headers, the authorization and custom headers.
+
+        :param access_token: token to authorize with, defaults to the session's current one
+        """
+        headers = dict(self.headers)
+        if access_token is None:
+            access_token = self.access_token
+        if access_token != None:
+            headers["Authorization"] = "Token %s" % access_token
+        if custom_headers:
+            headers.update(custom_headers)
 
-        return {**self.headers, **custom_headers}
+        return headers
 
 
 class OrbitalPasswordSession(Session):
-    def __init__(self, email: str, password: str, access_token: str = None, vendor: Vendor = Neato()):
-        super().__init__(vendor=vendor)
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        access_token: str = None,
+        vendor: Vendor = Neato(),
+        http: Optional[requests.Session] = None,
+        lazy: bool = False,
+        cache: Optional[ResponseCache] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        hedge: Optional[HedgePolicy] = None,
+        router: Optional[EndpointRouter] = None,
+    ):
+        """
+        Initialize the session.
+
+        :param lazy: defer the login until the first request is sent
+        """
+        super().__init__(
+            vendor=vendor,
+            http=http,
+            cache=cache,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            hedge=hedge,
+            router=router,
+        )
+        self._lock = threading.RLock()
         self._email = email
         self._password = password
         self.access_token = access_token
+        self.is_active = access_token != None
 
-        if self.access_token == None:
+        if self.access_token == None and not lazy:
             self._login(email, password)
 
+    def login(self) -> None:
+        """
+        Login to your MyNeato account if the session is not active yet
+        """
+        if self.is_active:
+            return
+
+        with self._lock:
+            if not self.is_active:
+                self._login(self._email, self._password)
+
+    @property
+    def cache_scope(self):
+        # Unlike the token, the account stays the same across logins
+        if self._email is None:
+            return super().cache_scope
+
+        return self.endpoint, self._email
+
+    def refresh_token(self, stale_token: str) -> None:
+        """
+        Login again after the server rejected stale_token.
+        Threads which saw the same stale token trigger only one login.
+        """
+        with self._lock:
+            if self.access_token == stale_token:
+                self.is_active = False
+                self._login(self._email, self._password)
+
     def _login(self, email: str, password: str) -> None:
         """
         Login to your MyNeato account
@@ -59,24 +290,30 @@ class OrbitalPasswordSession(Session):
         _LOGGER.debug("Activating session")
 
         try:
-            response = requests.post(
-                urljoin(self.endpoint, "vendors/neato/sessions"),
+            # Logging in twice is harmless
+            response = self.routed(lambda endpoint: self.http.post(
+                urljoin(endpoint, "vendors/neato/sessions"),
                 json={
                     "email": email,
                     "password": password,
                 },
-                headers=self.headers,
-            )
+                headers=dict(self.headers),
+                timeout=self.timeout(),
+            ), idempotent=True)
 
             response.raise_for_status()
 
             self.access_token = response.json()["token"]
 
             self.is_active = True
+        except requests.exceptions.Timeout as ex:
+            raise MyNeatoRobotTimeoutException("Timed out logging in to MyNeato API.") from ex
+        except MyNeatoTimeoutException as ex:
+            # The deadline passed before the request was sent
+            raise MyNeatoRobotTimeoutException(ex.message) from ex
         except (
             requests.exceptions.ConnectionError,
             requests.exceptions.HTTPError,
-            requests.exceptions.Timeout,
         ) as ex:
             if (
                 isinstance(ex, requests.exceptions.HTTPError)
@@ -88,21 +325,64 @@ class OrbitalPasswordSession(Session):
             raise MyNeatoRobotException("Unable to connect to MyNeato API.") from ex
 
     def get(self, path, **kwargs):
-        if not self.is_active:
-            self._login(self._email, self._password)
+        if self.cache is not None and set(kwargs) <= {"params"}:
+            return self.cache.get(
+                path,
+                lambda: self._get(path, **kwargs),
+                params=kwargs.get("params"),
+                scope=self.cache_scope,
+            )
 
-        self.headers["Authorization"] = "Token %s" % self.access_token
+        return self._get(path, **kwargs)
 
-        url = self.urljoin(path)
-        headers = self.generate_headers(kwargs.pop("headers", None))
-        try:
-            response = requests.get(url, headers=headers, **kwargs)
+    @traced("Session.get")
+    def _get(self, path, **kwargs):
+        self.login()
+
+        custom_headers = kwargs.pop("headers", None)
+
+        def exchange(url, token, phases):
+            started = time.perf_counter()
+            response = self.http.get(
+                url, headers=self.generate_headers(custom_headers, token), timeout=self.timeout(), **kwargs
+            )
+            headers = response.elapsed.total_seconds()
+            phases.append(("headers", headers))
+            phases.append(("body", max(time.perf_counter() - started - headers, 0)))
+
+            return response
+
+        def fetch(endpoint):
+            url = self.urljoin(path, endpoint)
+            # Timings of this attempt, recorded only if its response is used
+            phases = []
+            # Authorize with the token which is reported as stale on a 401
+            token = self.access_token
+            response = exchange(url, token, phases)
+            if response.status_code == 401:
+                _LOGGER.debug("Access token was rejected, logging in again")
+                started = time.perf_counter()
+                self.refresh_token(token)
+                phases.append(("login", time.perf_counter() - started))
+                response = exchange(url, self.access_token, phases)
             response.raise_for_status()
+
+            return response, phases
+
+        try:
+            # Latencies per kind of path, large floorplan downloads must not set the hedge delay of users/me
+            response, phases = self.send(
+                "GET %s" % _path_kind(path), lambda: self.routed(fetch, idempotent=True), idempotent=True
+            )
+        except requests.exceptions.Timeout as ex:
+            raise MyNeatoTimeoutException("Timed out waiting for MyNeato servers.") from ex
         except (
             requests.exceptions.ConnectionError,
             requests.exceptions.HTTPError,
-            requests.exceptions.Timeout,
         ) as ex:
             raise MyNeatoException("Unable to connect to MyNeato servers.") from ex
 
+        for name, seconds in phases:
+            add_phase(name, seconds)
+
         return response
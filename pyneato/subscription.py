@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, List
+
+from .enum import RobotStateEnum
+from .exception import MyNeatoException, MyNeatoRobotException
+from .robot_state import RobotState
+
+if TYPE_CHECKING:
+    from .robot import Robot
+
+_LOGGER = logging.getLogger(__name__)
+
+_STOPPED = object()
+
+
+def _state_key(state: RobotState):
+    details = state.details
+    return (
+        state.action,
+        state.state,
+        tuple(sorted(state.available_commands)),
+        None if details is None else (details.charge, details.is_charging, details.is_docked),
+    )
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    return True
+
+
+def _put(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, item):
+    try:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+    except RuntimeError:
+        # The consuming event loop has been closed in the meantime
+        pass
+
+
+class StateSubscription:
+    """
+    Delivers state updates of one or more robots.
+
+    The Orbital API offers no push channel, so the state is polled with an
+    adaptive interval: a robot is polled every ``min_interval`` seconds while
+    its state changes or while it is busy and the interval grows by
+    ``backoff`` up to ``max_interval`` while nothing happens.
+
+    Updates are delivered to listeners as ``callback(robot, state)`` from the
+    polling thread or via ``async for robot, state in subscription``.
+    Only changed states are delivered.
+    """
+
+    def __init__(
+        self,
+        robots: List["Robot"],
+        callback: Callable = None,
+        min_interval: float = 5,
+        max_interval: float = 120,
+        backoff: float = 2.0,
+    ):
+        self._robots = list(robots)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._listeners = []
+        self._queues = []
+        self._last = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        if callback is not None:
+            self.add_listener(callback)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_listener(self, callback: Callable) -> None:
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable) -> None:
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def start(self) -> "StateSubscription":
+        if self.is_running:
+            return self
+
+        # Every run has its own event, a run which was stopped without
+        # waiting for it must not be revived by the next start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name="pyneato-subscription", daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop polling. Waits for a poll in progress unless called from the
+        polling thread or an event loop, which it would block.
+        """
+        self._stop.set()
+        if (
+            self._thread is not None
+            and self._thread is not threading.current_thread()
+            and not _in_event_loop()
+        ):
+            self._thread.join()
+        self._thread = None
+
+        with self._lock:
+            queues = list(self._queues)
+
+        for loop, queue in queues:
+            _put(loop, queue, _STOPPED)
+
+    def _run(self, stop: threading.Event):
+        now = time.monotonic()
+        schedule = [(now, index, self._min_interval) for index in range(len(self._robots))]
+        heapq.heapify(schedule)
+
+        while schedule and not stop.is_set():
+            due, index, interval = schedule[0]
+            if stop.wait(max(0, due - time.monotonic())):
+                break
+
+            heapq.heappop(schedule)
+            interval = self._poll(self._robots[index], interval, stop)
+            heapq.heappush(schedule, (time.monotonic() + interval, index, interval))
+
+    def _poll(self, robot, interval: float, stop: threading.Event) -> float:
+        try:
+            state = robot.get_state()
+        except (MyNeatoException, MyNeatoRobotException) as ex:
+            _LOGGER.warning("Unable to poll state of %s: %s", robot.name, ex.message)
+            return min(interval * self._backoff, self._max_interval)
+        except Exception:  # pylint: disable=broad-except
+            # e.g. a state unknown to RobotStateEnum, must not stop polling the other robots
+            _LOGGER.exception("Unable to poll state of %s", robot.name)
+            return min(interval * self._backoff, self._max_interval)
+
+        key = _state_key(state)
+        changed = self._last.get(robot.serial) != key
+        self._last[robot.serial] = key
+
+        # No updates after stop, which may not have waited for this poll
+        if changed and not stop.is_set():
+            self._notify(robot, state)
+
+        if changed or state.state == RobotStateEnum.BUSY:
+            return self._min_interval
+
+        return min(interval * self._backoff, self._max_interval)
+
+    def _notify(self, robot, state: RobotState):
+        with self._lock:
+            listeners = list(self._listeners)
+            queues = list(self._queues)
+
+        for callback in listeners:
+            try:
+                callback(robot, state)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("State listener failed for %s", robot.name)
+
+        for loop, queue in queues:
+            _put(loop, queue, (robot, state))
+
+    async def _iterate(self):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._queues.append(entry)
+        self.start()
+
+        try:
+            while True:
+                update = await entry[1].get()
+                if update is _STOPPED:
+                    return
+                yield update
+        finally:
+            with self._lock:
+                self._queues.remove(entry)
@@ -0,0 +1,215 @@
+"""
+Opt-in timing of the phases of API calls.
+
+Assign a Tracer to ``session.tracer`` to record a Span per phase of
+Session.get, Robot._message, Account.refresh_robots, Account.get_floorplan
+and Floorplan.refresh_tracks. Phases are ``request`` (the HTTP exchange,
+split by Session.get into ``headers``, the time until the response headers
+arrived, ``body`` and ``login``, a login again after the token was
+rejected), ``decode`` (JSON decoding), ``validate`` (schema validation) and
+``construct`` (building pyneato objects). Of hedged requests only the
+attempt whose response is used is timed.
+
+Run ``python -m pyneato.tracing --endpoint URL`` to print a per-phase
+breakdown of a run against a (mock) server.
+"""
+import argparse
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class Span:
+    name: str
+    phase: str
+    start: float
+    duration: float
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+
+class Tracer:
+    """
+    Collects spans. sink, if given, is called with every span as it is
+    recorded, e.g. to forward it to a tracing system.
+    """
+
+    def __init__(self, sink: Optional[Callable[[Span], None]] = None):
+        self._sink = sink
+        self._spans = []
+        self._lock = threading.Lock()
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans = []
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+        if self._sink is not None:
+            self._sink(span)
+
+    def summary(self) -> Dict[tuple, tuple]:
+        """
+        Return (count, total seconds) by (name, phase).
+        """
+        totals = defaultdict(lambda: [0, 0.0])
+        for span in self.spans:
+            total = totals[(span.name, span.phase)]
+            total[0] += 1
+            total[1] += span.duration
+
+        return {key: tuple(value) for key, value in totals.items()}
+
+
+class Trace:
+    """
+    Timing of one call. Durations of repeated phases are summed up and
+    recorded as one span per phase when the trace is closed.
+    """
+
+    def __init__(self, tracer: Tracer, name: str, attributes: dict):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._start = time.time()
+        self._started = time.perf_counter()
+        self._phases = defaultdict(float)
+
+    @contextmanager
+    def phase(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[phase] += time.perf_counter() - started
+
+    def add(self, phase: str, seconds: float) -> None:
+        self._phases[phase] += seconds
+
+    def close(self) -> None:
+        for phase, duration in self._phases.items():
+            self._tracer.record(Span(self._name, phase, self._start, duration, self._attributes))
+        self._tracer.record(Span(
+            self._name, "total", self._start, time.perf_counter() - self._started, self._attributes
+        ))
+
+
+class _NullTrace:
+    @contextmanager
+    def phase(self, phase: str):
+        yield
+
+    def add(self, phase: str, seconds: float) -> None:
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+
+_current = contextvars.ContextVar("pyneato_trace", default=_NULL_TRACE)
+
+
+@contextmanager
+def trace(session, name: str, **attributes):
+    """
+    Trace a call if the session has a tracer, otherwise do nothing.
+    """
+    tracer = getattr(session, "tracer", None)
+    if tracer is None:
+        yield _NULL_TRACE
+        return
+
+    current = Trace(tracer, name, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        current.close()
+
+
+def traced(name: str):
+    """
+    Decorate a method of an object with a session, or of a session, to trace its calls.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with trace(getattr(self, "_session", self), name):
+                return fn(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def phase(name: str):
+    """
+    Time a phase of the traced call in progress.
+    """
+    return _current.get().phase(name)
+
+
+def add_phase(name: str, seconds: float) -> None:
+    _current.get().add(name, seconds)
+
+
+def main(argv=None):
+    from .account import Account
+    from .neato import Neato
+    from .session import OrbitalPasswordSession
+
+    parser = argparse.ArgumentParser(
+        description="Print a per-phase timing breakdown of the main API calls."
+    )
+    parser.add_argument("--endpoint", help="API endpoint, e.g. of a mock server")
+    parser.add_argument("--email", default=os.environ.get("MYNEATO_USER"))
+    parser.add_argument("--password", default=os.environ.get("MYNEATO_PASSWORD"))
+    args = parser.parse_args(argv)
+
+    vendor = Neato()
+    if args.endpoint:
+        vendor = type("Endpoint", (Neato,), {"endpoint": args.endpoint})()
+
+    tracer = Tracer()
+    session = OrbitalPasswordSession(args.email, args.password, vendor=vendor, lazy=True)
+    session.tracer = tracer
+    account = Account(session)
+
+    def attempt(description: str, fn: Callable, *args):
+        try:
+            return fn(*args)
+        except Exception as ex:  # pylint: disable=broad-except
+            # e.g. a state unknown to RobotStateEnum, the other calls are still timed
+            message = getattr(ex, "message", None) or "%s: %s" % (type(ex).__name__, ex)
+            print("Unable to %s: %s" % (description, message))
+
+            return None
+
+    robots = attempt("get robots", lambda: account.robots) or []
+    floorplans = []
+    for robot in robots:
+        floorplans.extend(attempt("get floorplans of %s" % robot.name, account.get_floorplan, robot) or [])
+    for floorplan in floorplans:
+        attempt("get tracks of %s" % floorplan.name, floorplan.refresh_tracks)
+    for robot in robots:
+        attempt("get state of %s" % robot.name, robot.get_state)
+
+    print("%-30s %-10s %6s %12s %12s" % ("call", "phase", "count", "total ms", "mean ms"))
+    for (name, phase_name), (count, total) in sorted(tracer.summary().items()):
+        print("%-30s %-10s %6d %12.2f %12.2f" % (name, phase_name, count, total * 1000, total * 1000 / count))
+
+
+if __name__ == "__main__":
+    main()
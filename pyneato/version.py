@@ -1,6 +1,6 @@
-import pkg_resources
-
 try:
-    __version__ = pkg_resources.get_distribution("pyneato").version
+    from importlib.metadata import version
+
+    __version__ = version("pyneato")
 except Exception:  # pylint: disable=broad-except
     __version__ = "unknown"
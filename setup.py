@@ -17,4 +17,5 @@ setup(
     package_dir={"pyneato": "pyneato"},
     package_data={"pyneato": ["cert/*.crt"]},
     install_requires=["requests", "requests_oauthlib", "voluptuous"],
+    entry_points={"console_scripts": ["pyneato = pyneato.cli:main"]},
 )
@@ -0,0 +1,130 @@
+import json
+import socket
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from pyneato.neato import Neato
+
+StubRequest = namedtuple("StubRequest", "method path query headers json")
+
+
+class StubServer:
+    """
+    Local stand-in for the Orbital API.
+
+    Handlers are registered per method and path with ``route`` and are
+    called with a StubRequest from the server's threads. They return
+    ``(status, body)``; body is sent as JSON. A handler returning None
+    closes the connection without a response. Unrouted requests get a 404.
+    Every request is recorded in ``requests``.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.endpoint = "http://127.0.0.1:%d/" % self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening and drop kept-alive connections, like a server going down."""
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def route(self, method, path, handler):
+        self.routes[(method, path.strip("/"))] = handler
+
+    def requests_to(self, method, path):
+        with self._lock:
+            return [
+                request for request in self.requests
+                if request.method == method and request.path == path.strip("/")
+            ]
+
+    def _dispatch(self, request):
+        with self._lock:
+            self.requests.append(request)
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            return 404, {"message": "not found"}
+
+        return handler(request)
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub._connections.add(self.connection)
+
+            def finish(self):
+                with stub._lock:
+                    stub._connections.discard(self.connection)
+                super().finish()
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                result = stub._dispatch(StubRequest(
+                    self.command,
+                    url.path.strip("/"),
+                    {key: values[-1] for key, values in parse_qs(url.query).items()},
+                    dict(self.headers),
+                    json.loads(body) if body else None,
+                ))
+                if result is None:
+                    self.close_connection = True
+                    return
+
+                status, data = result
+
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_HEAD = _handle
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def vendor(stub):
+    return type(
+        "Stub", (Neato,), {"endpoint": stub.endpoint, "endpoints": (stub.endpoint,)}
+    )()
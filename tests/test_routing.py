@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from conftest import StubServer
+from pyneato.account import Account
+from pyneato.exception import MyNeatoRobotException
+from pyneato.neato import Neato
+from pyneato.session import OrbitalPasswordSession
+
+
+def robot_json(serial):
+    return {
+        "id": "id-%s" % serial,
+        "user_id": "user",
+        "serial": serial,
+        "name": "Robot %s" % serial,
+        "model_name": "D10",
+        "firmware": "4.6.0",
+        "timezone": "Europe/Berlin",
+        "birth_date": "2020-01-01T00:00:00Z",
+        "vendor": "neato",
+    }
+
+
+def serve(stub, serials, slow=()):
+    """
+    Serve the given robots, answering state.show for the serials in slow late.
+    Every message is recorded in stub.requests; pause requests are answered by stub.pause.
+    """
+    stub.route("GET", "users/me/robots", lambda request: (200, [robot_json(serial) for serial in serials]))
+    stub.pause = lambda request: (200, {"ability": "cleaning.pause"})
+
+    def message(request):
+        ability = request.query["ability"]
+        if ability == "cleaning.pause":
+            return stub.pause(request)
+        if request.path.split("/")[3] in slow:
+            threading.Event().wait(0.2)
+
+        return 200, {"ability": ability}
+
+    for serial in serials:
+        stub.route("POST", "vendors/neato/robots/%s/messages" % serial, message)
+
+
+@pytest.fixture
+def stubs():
+    servers = [StubServer(), StubServer()]
+    for server in servers:
+        server.start()
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def account_of(stubs):
+    vendor = type(
+        "Stub", (Neato,), {
+            "endpoint": stubs[0].endpoint, "endpoints": tuple(stub.endpoint for stub in stubs)
+        },
+    )()
+
+    return Account(OrbitalPasswordSession("e", "p", access_token="t", vendor=vendor))
+
+
+def pauses(stub, serial):
+    return [
+        request for request in stub.requests_to("POST", "vendors/neato/robots/%s/messages" % serial)
+        if request.query["ability"] == "cleaning.pause"
+    ]
+
+
+def test_robots_are_routed_to_their_fastest_endpoint(stubs):
+    serve(stubs[0], ["s1", "s2"], slow=["s2"])
+    serve(stubs[1], ["s1", "s2"], slow=["s1"])
+    robots = {robot.serial: robot for robot in account_of(stubs).robots}
+
+    assert robots["s1"].pause_cleaning()
+    assert robots["s2"].pause_cleaning()
+
+    assert len(pauses(stubs[0], "s1")) == 1 and not pauses(stubs[1], "s1")
+    assert len(pauses(stubs[1], "s2")) == 1 and not pauses(stubs[0], "s2")
+
+
+def test_command_without_response_is_not_repeated_elsewhere(stubs):
+    serve(stubs[0], ["s1"])
+    serve(stubs[1], ["s1"], slow=["s1"])
+    # The command arrives, but the connection is closed before the response
+    stubs[0].pause = lambda request: None
+    robot = account_of(stubs).robots[0]
+
+    with pytest.raises(MyNeatoRobotException):
+        robot.pause_cleaning()
+
+    assert len(pauses(stubs[0], "s1")) == 1
+    assert not pauses(stubs[1], "s1")
+
+
+def test_command_fails_over_if_endpoint_refuses_connections(stubs):
+    serve(stubs[0], ["s1"])
+    serve(stubs[1], ["s1"], slow=["s1"])
+    robot = account_of(stubs).robots[0]
+    robot.info_robot()
+    stubs[0].stop()
+
+    assert robot.pause_cleaning()
+
+    assert len(pauses(stubs[1], "s1")) == 1
@@ -0,0 +1,83 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyneato.session import OrbitalPasswordSession
+
+THREADS = 32
+
+
+class TokenServer:
+    """
+    Accepts only the token of the most recent login and echoes what a request was authorized with.
+    """
+
+    def __init__(self, stub):
+        self.logins = 0
+        self.token = None
+        self._tokens = ("token-%d" % number for number in itertools.count(1))
+        self._lock = threading.Lock()
+        stub.route("POST", "vendors/neato/sessions", self.login)
+        stub.route("GET", "users/me", self.me)
+
+    def login(self, request):
+        with self._lock:
+            self.logins += 1
+            self.token = next(self._tokens)
+
+            return 200, {"token": self.token}
+
+    def revoke(self):
+        with self._lock:
+            self.token = None
+
+    def me(self, request):
+        authorization = request.headers.get("Authorization")
+        with self._lock:
+            if authorization != "Token %s" % self.token:
+                return 401, {"message": "invalid token"}
+
+        return 200, {"authorization": authorization, "thread": request.headers.get("X-Thread")}
+
+
+def run_threads(session):
+    barrier = threading.Barrier(THREADS)
+
+    def work(number):
+        barrier.wait()
+        results = []
+        for _ in range(5):
+            response = session.get("users/me", headers={"X-Thread": str(number)})
+            results.append((number, response.json()))
+
+        return results
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return [result for results in executor.map(work, range(THREADS)) for result in results]
+
+
+def test_one_login_per_rejected_token(stub, vendor):
+    server = TokenServer(stub)
+    session = OrbitalPasswordSession("e", "p", access_token="expired", vendor=vendor)
+
+    run_threads(session)
+    assert server.logins == 1
+
+    server.revoke()
+    run_threads(session)
+    assert server.logins == 2
+    assert session.access_token == server.token
+
+
+def test_no_header_leakage_between_threads(stub, vendor):
+    server = TokenServer(stub)
+    session = OrbitalPasswordSession("e", "p", access_token="expired", vendor=vendor)
+
+    results = run_threads(session)
+
+    assert len(results) == THREADS * 5
+    for number, data in results:
+        assert data["thread"] == str(number)
+        assert data["authorization"] == "Token %s" % server.token
+    assert "Authorization" not in session.headers
+    assert "X-Thread" not in session.headers
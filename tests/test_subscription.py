@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import threading
+import time
+
+from pyneato.account import Account
+from pyneato.enum import RobotStateEnum
+from pyneato.session import OrbitalPasswordSession
+
+
+def robot_json(serial):
+    return {
+        "id": "id-%s" % serial,
+        "user_id": "user",
+        "serial": serial,
+        "name": "Robot %s" % serial,
+        "model_name": "D10",
+        "firmware": "4.6.0",
+        "timezone": "Europe/Berlin",
+        "birth_date": "2020-01-01T00:00:00Z",
+        "vendor": "neato",
+    }
+
+
+def state_json(state="idle", charge=100):
+    return {
+        "ability": "state.show",
+        "action": "invalid",
+        "state": state,
+        "available_commands": {
+            "cancel": False, "pause": False, "resume": False, "return_to_base": False, "start": True
+        },
+        "cleaning_center": {"bag_status": "bag_ok", "base_error": None, "is_extracting": False},
+        "details": {
+            "base_type": "standard",
+            "charge": charge,
+            "is_charging": False,
+            "is_docked": True,
+            "is_quickboost": False,
+            "quickboost_estimate": 0,
+        },
+    }
+
+
+def serve_robots(stub, states):
+    """
+    Serve the given robots; states maps a serial to an iterator of state payloads.
+    """
+    stub.route("GET", "users/me/robots", lambda request: (200, [robot_json(serial) for serial in states]))
+    for serial, payloads in states.items():
+        lock = threading.Lock()
+
+        def message(request, payloads=payloads, lock=lock):
+            with lock:
+                return 200, next(payloads)
+
+        stub.route("POST", "vendors/neato/robots/%s/messages" % serial, message)
+
+
+def wait_for(condition, timeout=5):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+
+    return condition()
+
+
+def test_robot_subscribe_delivers_changed_states(stub, vendor):
+    serve_robots(stub, {"s1": itertools.chain(
+        [state_json(charge=90), state_json(charge=90), state_json(charge=80)],
+        itertools.repeat(state_json(charge=80)),
+    )})
+    robot = Account(OrbitalPasswordSession("e", "p", access_token="t", vendor=vendor)).robots[0]
+
+    updates = []
+    subscription = robot.subscribe(
+        lambda robot, state: updates.append(state.details.charge), min_interval=0.01, max_interval=0.02
+    )
+    try:
+        assert wait_for(lambda: len(updates) >= 2)
+        assert wait_for(lambda: len(stub.requests_to("POST", "vendors/neato/robots/s1/messages")) > 5)
+    finally:
+        subscription.stop()
+
+    assert updates == [90, 80]
+
+
+def test_subscription_survives_unexpected_errors(stub, vendor):
+    serve_robots(stub, {
+        "broken": itertools.repeat(state_json(state="exploding")),
+        "s2": (state_json(charge=charge) for charge in itertools.count(100, -1)),
+    })
+    account = Account(OrbitalPasswordSession("e", "p", access_token="t", vendor=vendor))
+
+    updates = []
+    subscription = account.subscribe(
+        lambda robot, state: updates.append(robot.serial), min_interval=0.01, max_interval=0.02
+    )
+    try:
+        assert wait_for(lambda: len(stub.requests_to("POST", "vendors/neato/robots/broken/messages")) >= 3)
+        assert wait_for(lambda: len(updates) >= 5)
+        assert subscription.is_running
+    finally:
+        subscription.stop()
+
+    assert set(updates) == {"s2"}
+
+
+def test_account_subscribe_async_for(stub, vendor):
+    serve_robots(stub, {
+        "s1": itertools.chain([state_json()], itertools.repeat(state_json(state="busy"))),
+        "s2": itertools.repeat(state_json(charge=50)),
+    })
+    account = Account(OrbitalPasswordSession("e", "p", access_token="t", vendor=vendor))
+
+    async def collect():
+        updates = []
+        subscription = account.subscribe(min_interval=0.01, max_interval=0.02)
+        async for robot, state in subscription:
+            updates.append((robot.serial, state.state))
+            if len(updates) == 3:
+                subscription.stop()
+
+        return updates
+
+    updates = asyncio.run(asyncio.wait_for(collect(), timeout=5))
+
+    assert sorted(updates, key=str) == sorted([
+        ("s1", RobotStateEnum.IDLE),
+        ("s1", RobotStateEnum.BUSY),
+        ("s2", RobotStateEnum.IDLE),
+    ], key=str)
+
+
+def test_stop_inside_async_for_does_not_block_the_loop(stub, vendor):
+    def slow_state(request):
+        threading.Event().wait(1)
+        return 200, state_json(charge=50)
+
+    serve_robots(stub, {"s1": itertools.repeat(state_json())})
+    robot = Account(OrbitalPasswordSession("e", "p", access_token="t", vendor=vendor)).robots[0]
+
+    async def stop_after_first_update():
+        subscription = robot.subscribe(min_interval=0.01, max_interval=0.01)
+        async for _ in subscription:
+            # The next poll is in progress for a second
+            stub.route("POST", "vendors/neato/robots/s1/messages", slow_state)
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            subscription.stop()
+
+            return time.monotonic() - started
+
+    assert asyncio.run(asyncio.wait_for(stop_after_first_update(), timeout=5)) < 0.5